@@ -1,17 +1,23 @@
 import os
+import time
 from dotenv import load_dotenv
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import scoped_session, sessionmaker
 from influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import SYNCHRONOUS
 import pymysql
 
+from metrics.metrics import STAGE_DURATION
+from metrics.tracing import current_context, end_span, normalize_query, query_hash, start_span
+
 # Load environment variables
 load_dotenv()
 
 class DBConnection:
-    def __init__(self):
+    def __init__(self, db_url=None, query_api=None):
+        """db_url and query_api replace the configured MySQL and InfluxDB, e.g. with SQLite and the
+        synthetic stand-ins of the benchmark package."""
         # MySQL Configuration
         self.username = os.getenv('DB_USER')
         self.password = os.getenv('DB_PASSWORD')
@@ -19,11 +25,18 @@ class DBConnection:
         self.host = os.getenv('DB_HOST')
         self.port = os.getenv('DB_PORT')
 
-        db_url = f"mysql+pymysql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}"
+        if db_url is None:
+            db_url = f"mysql+pymysql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}"
         self.engine = create_engine(db_url, echo=False)
         self.SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=self.engine))
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_cursor_execute)
 
         # InfluxDB Configuration
+        if query_api is not None:
+            self.influx_client = self.write_api = None
+            self.query_api = query_api
+            return
         self.influx_client = InfluxDBClient(
             url=os.getenv('INFLUXDB_URL'),
             token=os.getenv('TOKEN'),
@@ -32,6 +45,22 @@ class DBConnection:
         self.write_api = self.influx_client.write_api(write_options=SYNCHRONOUS)
         self.query_api = self.influx_client.query_api()
 
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+        # Normalizing and hashing the statement is only worth it inside a traced report
+        traced = current_context()[0] is not None
+        conn.info.setdefault("query_spans", []).append(
+            start_span("sql", statement=normalize_query(statement)[:200], query_hash=query_hash(statement))
+            if traced else None)
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        STAGE_DURATION.observe(elapsed, stage="sql")
+        # DBAPI rowcount is -1 for most SELECTs
+        end_span(conn.info["query_spans"].pop(), rows=cursor.rowcount if cursor.rowcount >= 0 else None)
+
     @contextmanager
     def session_scope(self):
         """Provide a transactional scope around a series of operations."""
@@ -48,4 +77,5 @@ class DBConnection:
     def close_connections(self):
         """Close all database connections."""
         self.SessionLocal.remove()
-        self.influx_client.close()
+        if self.influx_client is not None:
+            self.influx_client.close()
@@ -1,40 +1,96 @@
+import logging
+import os
 from concurrent.futures import ThreadPoolExecutor
+from power_data.aggregation import energy_breakdown_for_report_type
+from power_data.comparison import compare_periods, comparison_for_report_type, device_movements, period_summary
+from power_data.dataset import ReportDataset
+from power_data.emissions import with_emissions
 from power_data.power import PowerData
-import pandas as pd
+from power_data.ranking import DEFAULT_RANK_METRIC, RANK_METRICS, rank_devices, top_device_by_group
+from power_data.report_type import report_type_options
+from metrics.tracing import submit_traced
 
-from report.test_inter import CreativeEnergyReport
+from report.Pue import CreativeEnergyReport
+from report.exporters import EXPORTERS, output_format_for_report_type
+from report.profiles import profile_for_report_type
+
+logger = logging.getLogger(__name__)
+
+# Reports with no site_id cover every site in one consolidated report
+FLEET_SITE_NAME = "All Sites"
 
 class GenerateReport:
-    def __init__(self):
-        self.power = PowerData()
+    def __init__(self, db_connection=None, clock=None):
+        self.power = PowerData(db_connection, clock)
         self.powerreport = CreativeEnergyReport()
+        self.rank_metric = os.getenv("DEVICE_RANK_METRIC", DEFAULT_RANK_METRIC)
+        if self.rank_metric not in RANK_METRICS:
+            raise ValueError(f"Unsupported ranking metric: {self.rank_metric}")
 
-    def get_results(self, site_id, duration,site_name,filename):
+    def get_results(self, site_id, duration,site_name,filename, report_type=None):
 
-        with ThreadPoolExecutor(max_workers=4) as executor:
+        logger.info("Report type %r sets options %s", report_type, report_type_options(report_type))
+        compare = comparison_for_report_type(report_type)
+        with ThreadPoolExecutor(max_workers=5) as executor:
             # Submit all tasks to be executed concurrently
             # future_pie_data = executor.submit(self.power.calculate_total_power_consumption, site_id, duration)
             # future_carbon_emission = executor.submit(self.power.calculate_carbon_emission, site_id, duration)
-            future_energy_data = executor.submit(self.power.calculate_energy_consumption_by_id_with_filter, site_id,
-                                                 duration)
-            future_cards_data = executor.submit(self.power.get_device_inventory, site_id)
-            future_top_devices = executor.submit(self.power.get_top_5_power_devices_with_filter, site_id, duration)
+            future_site_energy = submit_traced(executor, "calculate_site_energy", self.power.calculate_site_energy,
+                                               site_id, duration, energy_breakdown_for_report_type(report_type))
+            future_cards_data = submit_traced(executor, "get_device_inventory", self.power.get_device_inventory,
+                                              site_id)
+            future_devices = submit_traced(executor, "get_device_metrics", self.power.get_device_metrics, site_id,
+                                           duration)
 
-            future_rack_data = executor.submit(self.power.get_all_racks, site_id,duration)
+            future_rack_data = submit_traced(executor, "get_all_racks", self.power.get_all_racks, site_id,duration)
+            future_previous = submit_traced(executor, "calculate_previous_period",
+                                            self.power.calculate_previous_period, site_id, duration) if compare \
+                else None
 
 
             # Retrieve results from the futures
             # pie_data = future_pie_data.result()
             # carbon_emission = future_carbon_emission.result()
-            energy_data = future_energy_data.result()
+            site_energy = future_site_energy.result()
             cards_data = future_cards_data.result()
-            top_devices,bottom_devices = future_top_devices.result()
+            devices = future_devices.result()
             top_racks=future_rack_data.result()
+            previous, previous_window = future_previous.result() if compare else (None, None)
             # future_bottom_devices=future_bottom_devices.result()
 
-            print("Top",top_racks)
+            logger.debug("Top racks:\n%s", top_racks)
+
+        # CO2 comes from the same energy buckets as the trend, joined with the grid's carbon intensity
+        devices = with_emissions(devices, "ip_address", "co2emmissions",
+                                 site_energy.device_emissions.set_index("ip")["co2_kg"])
+        top_racks = with_emissions(top_racks, "rack_id", "co2", site_energy.rack_emissions)
+        cards_data["co2_emissions_kg"] = round(site_energy.co2_kg, 2)
+        top_devices, bottom_devices = rank_devices(devices, self.rank_metric)
+        sites = site_energy.sites
+        if sites is not None:
+            sites = sites.assign(top_device=sites["site_id"].map(
+                top_device_by_group(devices, "site_id", self.rank_metric)))
+            cards_data["total_sites"] = len(sites)
+        comparison = movements = None
+        if compare:
+            current = period_summary(site_energy.energy, site_energy.device_emissions)
+            names = devices.drop_duplicates("ip_address").set_index("ip_address")["device_name"]
+            comparison = compare_periods(current, previous)
+            movements = device_movements(current, previous, names)
+
+        dataset = ReportDataset(site_name=site_name, duration=duration, energy=site_energy.energy,
+                                top_devices=top_devices, bottom_devices=bottom_devices, racks=top_racks,
+                                summary=cards_data, energy_breakdown=site_energy.breakdown, sites=sites,
+                                rack_series=site_energy.rack_series, comparison=comparison,
+                                device_movements=movements, previous_period=previous_window)
+
+        output_format = output_format_for_report_type(report_type)
+        if output_format != "pdf":
+            # Machine consumers only need the numbers: skip charts and PDF layout entirely
+            EXPORTERS[output_format](filename, dataset)
+            return True
 
-        self.powerreport.generate_report(energy_data,cards_data,site_name,duration,top_devices,bottom_devices,top_racks,filename)
+        self.powerreport.generate_report(dataset, filename, profile=profile_for_report_type(report_type))
             # self.powerreport.create_pdf()
 
 
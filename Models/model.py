@@ -31,6 +31,8 @@ class Site(Base):
     longitude = Column(String(255), nullable=True)
     status = Column(String(255), nullable=True)
     total_devices = Column(String(255), nullable=True)
+    # electricityMap zone used for the site's grid mix and carbon intensity
+    zone = Column(String(16), nullable=True, default="AE")
 
     # Relationships
     reports = relationship("Reports", back_populates="site")
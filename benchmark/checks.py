@@ -0,0 +1,102 @@
+"""Arithmetic checks of the report pipeline against a flat synthetic load.
+
+    python -m benchmark.checks
+
+Every device of the fleet draws a constant 1 kW, so each duration must report exactly 1 kWh per device
+per hour of its range, however its first and last buckets are cut, and likewise for the previous period
+it is compared with, whose dates are checked against the calendar.
+"""
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from benchmark.database import benchmark_connection
+from benchmark.fake_influx import FleetShape
+from benchmark.scenarios import DURATIONS
+
+# A clock in the middle of a day and a month, so both ends of every range cut a bucket
+CLOCK = datetime(2026, 10, 19, 16, 40)
+FLAT_FLEET = FleetShape(devices=4, devices_per_rack=2, psus_per_device=1, load_w=1000.0)
+# The previous period of every duration at CLOCK: the same dates a year earlier for year ranges, otherwise
+# the window of the same length ending where the range starts
+PREVIOUS_WINDOWS = {
+    "24 hours": ("2026-10-17 16:40", "2026-10-18 16:40"),
+    "7 Days": ("2026-10-05 16:40", "2026-10-12 16:40"),
+    "Current Month": ("2026-09-13 16:40", "2026-10-01 16:40"),
+    "Last Month": ("2026-08-03 16:40", "2026-09-01 16:40"),
+    "Last 3 Months": ("2026-03-13 16:40", "2026-07-01 16:40"),
+    "Last 6 Months": ("2025-09-12 16:40", "2026-04-01 16:40"),
+    "Last 9 Months": ("2025-03-16 16:40", "2026-01-01 16:40"),
+    "Current Year": ("2025-01-01 16:40", "2025-10-19 16:40"),
+    "Last Year": ("2024-01-01 16:40", "2024-12-31 16:40"),
+}
+
+
+def check_flat_energy(durations=DURATIONS, clock: datetime = CLOCK) -> list:
+    """Failures of "energy = devices x 1 kW x hours of the range", one message per duration."""
+    from power_data.power import PowerData
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        db_connection = benchmark_connection(FLAT_FLEET, directory)
+        power_data = PowerData(db_connection, clock=lambda: clock)
+        for duration in durations:
+            start_date, end_date = power_data.calculate_start_end_dates(duration)
+            expected = FLAT_FLEET.devices * FLAT_FLEET.load_w / 1000 * ((end_date - start_date) / timedelta(hours=1))
+            energy = power_data.calculate_site_energy(None, duration).device_emissions["energy_kwh"].sum()
+            if not np.isclose(energy, expected):
+                failures.append(f"{duration}: {energy:.2f} kWh, expected {expected:.2f} kWh")
+        db_connection.close_connections()
+    return failures
+
+
+def check_previous_windows(windows=PREVIOUS_WINDOWS, clock: datetime = CLOCK) -> list:
+    """Failures of "the previous period starts and ends on the expected dates", one message per duration."""
+    from power_data.comparison import previous_period
+    from power_data.power import PowerData
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        db_connection = benchmark_connection(FLAT_FLEET, directory)
+        power_data = PowerData(db_connection, clock=lambda: clock)
+        for duration, expected in windows.items():
+            window = previous_period(*power_data.calculate_start_end_dates(duration), duration)
+            if window != tuple(pd.Timestamp(date) for date in expected):
+                failures.append(f"{duration}: previous period {window[0]} to {window[1]}, "
+                                f"expected {expected[0]} to {expected[1]}")
+        db_connection.close_connections()
+    return failures
+
+
+def check_flat_comparison(durations=DURATIONS, clock: datetime = CLOCK) -> list:
+    """Failures of "the previous period has devices x 1 kW x hours of its window", one message per duration."""
+    from power_data.power import PowerData
+
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        db_connection = benchmark_connection(FLAT_FLEET, directory)
+        power_data = PowerData(db_connection, clock=lambda: clock)
+        for duration in durations:
+            previous, window = power_data.calculate_previous_period(None, duration)
+            expected = FLAT_FLEET.devices * FLAT_FLEET.load_w / 1000 * ((window[1] - window[0]) / timedelta(hours=1))
+            if not np.isclose(previous.energy_kwh, expected):
+                failures.append(f"{duration}: previous period {window[0]} to {window[1]} has "
+                                f"{previous.energy_kwh:.2f} kWh, expected {expected:.2f} kWh")
+        db_connection.close_connections()
+    return failures
+
+
+def main():
+    failures = check_flat_energy() + check_previous_windows() + check_flat_comparison()
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from Database.db_connector import DBConnection
+from Models.model import (APICController, Base, Building, Device, DeviceInventory, Rack, Site, Vendor,
+                          rack_building_association)
+from benchmark.fake_influx import ZONES, FakeQueryApi, FleetShape
+
+
+def seed_schema(db_connection: DBConnection, shape: FleetShape):
+    """Create every table of Models.model and fill sites, buildings, racks and devices for the shape.
+
+    Sites take racks round-robin, each site has one building, and each device has one controller
+    and one inventory row with the same id, as the repository joins them.
+    """
+    Base.metadata.create_all(db_connection.engine)
+    now = datetime.now()
+    site_ids = range(1, shape.sites + 1)
+    rack_ids = range(1, shape.racks + 1)
+    ips = shape.ips()
+    site_of_rack = {rack_id: (rack_id - 1) % shape.sites + 1 for rack_id in rack_ids}
+    rack_of_device = [(i // shape.devices_per_rack) + 1 for i in range(shape.devices)]
+
+    with db_connection.session_scope() as session:
+        session.execute(insert(Site), [
+            {"id": site_id, "site_name": f"Site {site_id}", "site_type": "DC", "status": "active",
+             "zone": ZONES[(site_id - 1) % len(ZONES)]} for site_id in site_ids])
+        session.execute(insert(Building), [
+            {"id": site_id, "building_name": f"Building {site_id}"} for site_id in site_ids])
+        session.execute(insert(Rack), [
+            {"id": rack_id, "rack_name": f"Rack {rack_id}", "site_id": site_of_rack[rack_id], "status": "active"}
+            for rack_id in rack_ids])
+        session.execute(insert(rack_building_association), [
+            {"rack_id": rack_id, "building_id": site_of_rack[rack_id]} for rack_id in rack_ids])
+        session.execute(insert(Vendor), [{"id": i, "vendor_name": f"Vendor {i}"} for i in range(1, 4)])
+        session.execute(insert(APICController), [
+            {"id": i + 1, "ip_address": ip, "created_at": now, "updated_at": now} for i, ip in enumerate(ips)])
+        session.execute(insert(Device), [
+            {"id": i + 1, "ip_address": ip, "device_name": f"device-{i + 1}", "device_type": "switch",
+             "OnBoardingStatus": True, "site_id": site_of_rack[rack_id], "rack_id": rack_id,
+             "vendor_id": i % 3 + 1}
+            for i, (ip, rack_id) in enumerate(zip(ips, rack_of_device))])
+        session.execute(insert(DeviceInventory), [
+            {"id": i + 1, "device_name": f"device-{i + 1}", "apic_controller_id": i + 1,
+             "rack_id": rack_id, "site_id": site_of_rack[rack_id], "manufacturer": "Cisco",
+             "status": "active"}
+            for i, rack_id in enumerate(rack_of_device)])
+
+
+def benchmark_connection(shape: FleetShape, directory: str) -> DBConnection:
+    """A DBConnection over a freshly seeded SQLite file and the fake InfluxDB for the shape."""
+    path = os.path.join(directory, f"bench_{shape.devices}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    db_connection = DBConnection(db_url=f"sqlite:///{path}", query_api=FakeQueryApi(shape))
+    seed_schema(db_connection, shape)
+    return db_connection
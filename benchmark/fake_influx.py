@@ -0,0 +1,187 @@
+import json
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from repo.influxdb_repository import GRID_SOURCES
+
+# Flux window -> pandas period, as the repository buckets them
+WINDOW_PERIODS = {"1h": "h", "1d": "D", "1mo": "M"}
+ZONES = ("AE", "DE", "FR")
+
+
+@dataclass(frozen=True)
+class FleetShape:
+    """Size of the synthetic fleet shared by the fake InfluxDB and the seeded SQLite schema."""
+    devices: int = 100
+    devices_per_rack: int = 20
+    sites: int = 1
+    psus_per_device: int = 2
+    sample_every_s: int = 60  # Collector sampling interval of the raw series
+    latency_s: float = 0.0  # Injected per query, as network round trip and server time
+    seed: int = 0
+    load_w: Optional[float] = None  # Constant input power of every PSU instead of the varied load, for checks
+
+    @property
+    def racks(self) -> int:
+        return -(-self.devices // self.devices_per_rack)
+
+    def ips(self) -> List[str]:
+        return [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(1, self.devices + 1)]
+
+
+class FakeQueryApi:
+    """Stand-in for influxdb_client's QueryApi answering the repository's Flux queries with synthetic series.
+
+    Values are deterministic per IP and seed. Every query is answered in the shape InfluxDB returns
+    it (windows, pivots, one table per series), so row counts follow the range, window and fleet size.
+    """
+
+    def __init__(self, shape: FleetShape):
+        self.shape = shape
+        self.queries = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def query_data_frame(self, query: str):
+        if self.shape.latency_s:
+            time.sleep(self.shape.latency_s)
+        if "electricitymap" in query:
+            result = self._zone_hourly(query)
+        elif "join.inner(" in query:
+            result = self._rack_percentiles(query)
+        elif "quantile(" in query:
+            result = self._percentiles(query)
+        elif "|> sum()" in query:
+            result = self._totals(query)
+        elif "|> mean()" in query:
+            result = self._traffic(query)
+        elif "createEmpty: true" in query:
+            result = self._energy_buckets(query)
+        elif "fn: sum" in query:
+            result = self._pin_windows(query)
+        else:
+            raise ValueError(f"Unsupported query for the fake InfluxDB: {query}")
+        with self._lock:
+            self.queries += 1
+            self.rows += sum(len(frame) for frame in result) if isinstance(result, list) else len(result)
+        return result
+
+    @staticmethod
+    def _range(query: str):
+        start, stop = re.search(r"range\(start: (\S+), stop: (\S+)\)", query).groups()
+        return pd.Timestamp(start).tz_convert(None), pd.Timestamp(stop).tz_convert(None)
+
+    @staticmethod
+    def _ips(query: str) -> List[str]:
+        match = re.search(r"set: (\[.*?\])", query)
+        if match:
+            return json.loads(match.group(1))
+        return re.findall(r'r\["ApicController_IP"\] == "([^"]+)"', query)
+
+    def _windows(self, query: str) -> pd.DatetimeIndex:
+        start, stop = self._range(query)
+        every = re.search(r"every: (\w+)", query).group(1)
+        times = pd.period_range(start, stop - pd.Timedelta(1), freq=WINDOW_PERIODS[every]).start_time
+        # timeSrc "_start" labels the first window with the range start
+        return pd.DatetimeIndex(np.maximum(times, start))
+
+    def _samples(self, query: str) -> float:
+        start, stop = self._range(query)
+        return max((stop - start).total_seconds() // self.shape.sample_every_s, 1)
+
+    def _device_params(self, ips: List[str]):
+        """Per-device mean PSU input (W), output efficiency and traffic byte rate."""
+        keys = np.array([zlib.crc32(ip.encode()) ^ self.shape.seed for ip in ips], dtype=np.uint64)
+        unit = (keys % 10007) / 10007
+        pin = 150 + 650 * unit if self.shape.load_w is None else np.full(len(ips), self.shape.load_w)
+        efficiency = 0.82 + 0.12 * ((keys >> 8) % 101) / 100
+        bytes_rate = 1e5 + 5e7 * ((keys >> 16) % 997) / 997
+        return pin, efficiency, bytes_rate
+
+    def _energy_buckets(self, query: str) -> List[pd.DataFrame]:
+        ips = self._ips(query)
+        times = self._windows(query)
+        psus = self.shape.psus_per_device
+        pin, efficiency, bytes_rate = self._device_params(ips)
+        # A daily load curve over every bucket, plus per-PSU jitter
+        hours = times.hour.to_numpy() + times.dayofyear.to_numpy() * 24
+        load = 1 + 0.15 * np.sin(hours / 24 * 2 * np.pi)
+        rng = np.random.default_rng(self.shape.seed)
+        jitter = rng.uniform(0.9, 1.1, (len(ips) * psus, 1))
+        if self.shape.load_w is not None:
+            load, jitter = np.ones_like(load), np.ones_like(jitter)
+        psu_pin = np.repeat(pin, psus)[:, None] * load[None, :] * jitter
+        psu = pd.DataFrame({
+            "result": "_result",
+            "table": np.repeat(np.arange(len(ips) * psus), len(times)),
+            "_time": np.tile(times, len(ips) * psus),
+            "ApicController_IP": np.repeat(np.asarray(ips, dtype=object), psus * len(times)),
+            "total_PIn": psu_pin.ravel(),
+            "total_POut": (psu_pin * np.repeat(efficiency, psus)[:, None]).ravel(),
+        })
+        traffic = pd.DataFrame({
+            "result": "_result",
+            "table": np.repeat(np.arange(len(ips)), len(times)) + len(ips) * psus,
+            "_time": np.tile(times, len(ips)),
+            "ApicController_IP": np.repeat(np.asarray(ips, dtype=object), len(times)),
+            "total_bytesRateLast": (bytes_rate[:, None] * load[None, :]).ravel(),
+        })
+        return [psu, traffic]
+
+    def _totals(self, query: str) -> pd.DataFrame:
+        ips = self._ips(query)
+        pin, efficiency, bytes_rate = self._device_params(ips)
+        samples = self._samples(query)
+        return pd.DataFrame({"result": "_result", "table": 0, "ApicController_IP": ips,
+                             "total_PIn": pin * samples * self.shape.psus_per_device,
+                             "total_POut": pin * efficiency * samples * self.shape.psus_per_device,
+                             "total_bytesRateLast": bytes_rate * samples})
+
+    def _percentiles(self, query: str) -> pd.DataFrame:
+        ips = self._ips(query)
+        pin, _, _ = self._device_params(ips)
+        return pd.DataFrame({"result": "_result", "table": 0, "ApicController_IP": ips,
+                             "power_p50": pin, "power_p95": pin * 1.14, "power_p99": pin * 1.2,
+                             "power_max": pin * 1.3})
+
+    def _rack_percentiles(self, query: str) -> pd.DataFrame:
+        pairs = pd.DataFrame(re.findall(r'\{ApicController_IP: "([^"]+)", rack_id: (\d+)\}', query),
+                             columns=["ip", "rack_id"]).astype({"rack_id": int})
+        pin, _, _ = self._device_params(pairs["ip"].tolist())
+        rack_pin = pd.Series(pin, index=pairs["rack_id"]).groupby(level=0).sum()
+        return pd.DataFrame({"result": "_result", "table": 0, "rack_id": rack_pin.index,
+                             "power_p50": rack_pin.to_numpy(), "power_p95": rack_pin.to_numpy() * 1.14,
+                             "power_p99": rack_pin.to_numpy() * 1.2, "power_max": rack_pin.to_numpy() * 1.3})
+
+    def _traffic(self, query: str) -> pd.DataFrame:
+        ips = self._ips(query)
+        _, _, bytes_rate = self._device_params(ips)
+        return pd.DataFrame({"result": "_result", "table": 0, "ApicController_IP": ips,
+                             "bandwidth": 1e7, "total_bytesRateLast": bytes_rate})
+
+    def _pin_windows(self, query: str) -> pd.DataFrame:
+        ips = self._ips(query)
+        times = self._windows(query)
+        pin, _, _ = self._device_params(ips)
+        per_window = self._samples(query) / max(len(times), 1)
+        return pd.DataFrame({"result": "_result", "table": 0, "_time": np.tile(times, len(ips)),
+                             "_value": np.repeat(pin * per_window, len(times))})
+
+    def _zone_hourly(self, query: str) -> pd.DataFrame:
+        zone = re.search(r'r\["zone"\] == "([^"]+)"', query).group(1)
+        start, stop = self._range(query)
+        times = pd.date_range(start.ceil("h"), stop, freq="h", inclusive="left")
+        base = 100 + zlib.crc32(zone.encode()) % 400
+        hours = np.arange(len(times))
+        frame = pd.DataFrame({"result": "_result", "table": 0, "_time": times,
+                              "carbonIntensity": base * (1 + 0.2 * np.sin(hours / 24 * 2 * np.pi))})
+        for i, source in enumerate(GRID_SOURCES):
+            frame[f"{source}_consumption"] = float(i * 37 % 500)
+        return frame
@@ -0,0 +1,229 @@
+"""Record a report run's InfluxDB responses and MySQL rows, and replay them offline.
+
+    python -m benchmark.replay record recordings/site3_7d --site-id 3 --duration "7 Days"
+    python -m benchmark.replay replay recordings/site3_7d --profile replay.prof
+
+A recording holds every Flux response as Parquet keyed by its query hash (as in report traces), a Parquet snapshot
+of the tables the report reads, the clock the run used and the report's tables as a Parquet export.
+Replay pins the same clock, so the repositories issue the same queries and get the same answers,
+and compares the report's tables with the recorded ones.
+"""
+import argparse
+import cProfile
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import insert, select
+
+from Database.db_connector import DBConnection
+from metrics.tracing import normalize_query, query_hash
+from Models.model import (APICController, Base, Building, Device, DeviceInventory, Rack, Reports, Site, Vendor,
+                          rack_building_association)
+from power_data.report_type import REPORT_TYPE_WORDS, report_type_words
+from report.exporters import output_format_for_report_type
+
+# Tables read while generating a report, in insertion (foreign key) order
+SNAPSHOT_TABLES = [Site.__table__, Building.__table__, Rack.__table__, rack_building_association, Vendor.__table__,
+                   APICController.__table__, Device.__table__, DeviceInventory.__table__]
+MANIFEST = "manifest.json"
+BASELINE = "baseline.zip"
+
+
+def parquet_report_type(report_type):
+    """report_type with its output format replaced by parquet, keeping the other words (compare, rack...)."""
+    words = [word for word in report_type_words(report_type) if REPORT_TYPE_WORDS.get(word, ("",))[0] != "format"]
+    return " ".join(words + ["parquet"])
+
+
+class RecordingQueryApi:
+    """Passes queries to a real QueryApi and writes each response under <directory>/flux."""
+
+    def __init__(self, query_api, directory: str):
+        self.query_api = query_api
+        self.directory = os.path.join(directory, "flux")
+        os.makedirs(self.directory, exist_ok=True)
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    def query_data_frame(self, query: str):
+        result = self.query_api.query_data_frame(query)
+        key = query_hash(query)
+        frames = result if isinstance(result, list) else [result]
+        for i, frame in enumerate(frames):
+            frame.to_parquet(os.path.join(self.directory, f"{key}_{i}.parquet"))
+        with self._lock:
+            self.queries[key] = {"query": normalize_query(query), "frames": len(frames),
+                                 "list": isinstance(result, list)}
+        return result
+
+
+class ReplayQueryApi:
+    """Answers queries from a recording; a query that was never recorded raises KeyError."""
+
+    def __init__(self, directory: str, queries: dict):
+        self.directory = os.path.join(directory, "flux")
+        self.queries = queries
+        self.calls = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def query_data_frame(self, query: str):
+        entry = self.queries.get(query_hash(query))
+        if entry is None:
+            raise KeyError(f"No recorded response for query: {normalize_query(query)}")
+        frames = [pd.read_parquet(os.path.join(self.directory, f"{query_hash(query)}_{i}.parquet"))
+                  for i in range(entry["frames"])]
+        with self._lock:
+            self.calls += 1
+            self.rows += sum(len(frame) for frame in frames)
+        return frames if entry["list"] else frames[0]
+
+
+def snapshot_tables(db_connection: DBConnection, directory: str):
+    """Write every row of SNAPSHOT_TABLES to <directory>/sql/<table>.parquet."""
+    os.makedirs(os.path.join(directory, "sql"), exist_ok=True)
+    with db_connection.engine.connect() as connection:
+        for table in SNAPSHOT_TABLES:
+            frame = pd.read_sql(select(table), connection)
+            frame.to_parquet(os.path.join(directory, "sql", f"{table.name}.parquet"), index=False)
+
+
+def restore_tables(db_url: str, directory: str, query_api) -> DBConnection:
+    """A DBConnection over a new database created from Models.model and filled from the snapshot."""
+    db_connection = DBConnection(db_url=db_url, query_api=query_api)
+    Base.metadata.create_all(db_connection.engine)
+    with db_connection.session_scope() as session:
+        for table in SNAPSHOT_TABLES:
+            frame = pd.read_parquet(os.path.join(directory, "sql", f"{table.name}.parquet"))
+            if len(frame):
+                session.execute(insert(table), frame.astype(object).where(frame.notna(), None).to_dict("records"))
+    return db_connection
+
+
+def _generate(db_connection, clock, manifest, filename, report_type):
+    from GenerateReport.generate import GenerateReport
+    from report.charts import shutdown_chart_pool
+
+    generate_report = GenerateReport(db_connection, clock=lambda: clock)
+    started = time.perf_counter()
+    try:
+        generate_report.get_results(manifest["site_id"], manifest["duration"], manifest["site_name"], filename,
+                                    report_type=report_type)
+    finally:
+        shutdown_chart_pool()
+    return time.perf_counter() - started
+
+
+def record(directory: str, site_id=None, duration=None, report_type=None, report_id=None, source=None):
+    """Run one report against the configured databases (or source) and save everything replay needs."""
+    from GenerateReport.generate import FLEET_SITE_NAME
+
+    os.makedirs(directory, exist_ok=True)
+    source = source or DBConnection()
+    if report_id is not None:
+        with source.session_scope() as session:
+            report = session.query(Reports).filter(Reports.id == report_id).one()
+            site_id, duration, report_type = report.site_id, report.duration, report.report_type
+    if duration is None:
+        raise ValueError("A duration or a report id is required")
+    with source.session_scope() as session:
+        site_name = FLEET_SITE_NAME if site_id is None else \
+            session.query(Site.site_name).filter(Site.id == site_id).scalar()
+
+    clock = datetime.today()
+    manifest = {"recorded_at": clock.isoformat(), "site_id": site_id, "site_name": site_name,
+                "duration": duration, "report_type": report_type}
+    query_api = source.query_api = RecordingQueryApi(source.query_api, directory)
+    snapshot_tables(source, directory)
+    wall_s = _generate(source, clock, manifest, os.path.join(directory, BASELINE), parquet_report_type(report_type))
+    manifest["queries"] = query_api.queries
+    with open(os.path.join(directory, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    source.close_connections()
+    print(f"Recorded {len(query_api.queries)} Flux queries in {wall_s:.3f}s to {directory}")
+
+
+def _tables(filename: str) -> dict:
+    with zipfile.ZipFile(filename) as archive:
+        return {os.path.splitext(name)[0]: pd.read_parquet(io.BytesIO(archive.read(name)))
+                for name in archive.namelist()}
+
+
+def compare_outputs(baseline: str, candidate: str, rtol: float = 1e-9) -> list:
+    """Differences between two Parquet report exports, one message per differing table."""
+    expected, actual = _tables(baseline), _tables(candidate)
+    differences = [f"{name}: missing" for name in expected.keys() - actual.keys()]
+    differences += [f"{name}: unexpected" for name in actual.keys() - expected.keys()]
+    for name in sorted(expected.keys() & actual.keys()):
+        try:
+            pd.testing.assert_frame_equal(expected[name], actual[name], check_dtype=False, rtol=rtol)
+        except AssertionError as e:
+            differences.append(f"{name}: {e}")
+    return differences
+
+
+def replay(directory: str, report_type=None, output=None, profile=None, rtol: float = 1e-9) -> list:
+    """Generate the recorded report offline and return its differences from the recorded tables.
+
+    With a report_type that does not export parquet the report is written to output and not compared.
+    """
+    with open(os.path.join(directory, MANIFEST)) as file:
+        manifest = json.load(file)
+    report_type = parquet_report_type(manifest["report_type"]) if report_type is None else report_type
+    compare = output_format_for_report_type(report_type) == "parquet"
+    output = output or os.path.join(directory, "replay.zip" if compare else "replay")
+
+    query_api = ReplayQueryApi(directory, manifest["queries"])
+    database = os.path.join(directory, "replay.db")
+    if os.path.exists(database):
+        os.remove(database)
+    db_connection = restore_tables(f"sqlite:///{database}", directory, query_api)
+    clock = datetime.fromisoformat(manifest["recorded_at"])
+
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    wall_s = _generate(db_connection, clock, manifest, output, report_type)
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(profile)
+    db_connection.close_connections()
+
+    print(f"Replayed {query_api.calls} Flux queries ({query_api.rows} rows) in {wall_s:.3f}s")
+    differences = compare_outputs(os.path.join(directory, BASELINE), output, rtol) if compare else []
+    for difference in differences:
+        print(difference)
+    return differences
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record a report run, or replay one offline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="run a report against the configured databases")
+    record_parser.add_argument("directory")
+    record_parser.add_argument("--report-id", type=int, default=None, help="take site, duration and type from Reports")
+    record_parser.add_argument("--site-id", type=int, default=None, help="omit for a fleet report")
+    record_parser.add_argument("--duration", default=None)
+    record_parser.add_argument("--report-type", default=None)
+    replay_parser = commands.add_parser("replay", help="generate a recorded report without network access")
+    replay_parser.add_argument("directory")
+    replay_parser.add_argument("--report-type", default=None, help="defaults to the recorded one, as parquet")
+    replay_parser.add_argument("--output", default=None)
+    replay_parser.add_argument("--profile", default=None, help="write cProfile stats to this file")
+    replay_parser.add_argument("--rtol", type=float, default=1e-9, help="relative tolerance of the comparison")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.directory, args.site_id, args.duration, args.report_type, args.report_id)
+    elif replay(args.directory, args.report_type, args.output, args.profile, args.rtol):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Report generation benchmarks against the synthetic fleet.
+
+    python -m benchmark.scenarios --devices 10 100 1000 10000 --latency 0.05
+
+Each (fleet size, duration) runs GenerateReport.get_results once in a fresh process, so wall time
+includes a cold daemon's first report and peak RSS belongs to that report alone.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+
+from benchmark.fake_influx import FleetShape
+
+# Every duration PowerData.calculate_start_end_dates accepts (the quarters are aliases of "Last N Months")
+DURATIONS = ["24 hours", "7 Days", "Current Month", "Last Month", "Last 3 Months", "Last 6 Months",
+             "Last 9 Months", "Current Year", "Last Year"]
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(shape: FleetShape, duration: str, report_type, site_id, directory: str, trace_dir=None) -> dict:
+    """Seed the fleet, generate one report and measure it; runs in the worker process."""
+    from GenerateReport.generate import FLEET_SITE_NAME, GenerateReport
+    from benchmark.database import benchmark_connection
+    from metrics.metrics import STAGE_DURATION
+    from metrics.tracing import trace_report
+    from report.charts import shutdown_chart_pool
+    from report.exporters import output_extension
+
+    filename = os.path.join(directory, f"report_{shape.devices}_{duration.replace(' ', '_')}"
+                                       f"{output_extension(report_type)}")
+    db_connection = benchmark_connection(shape, directory)
+    generate_report = GenerateReport(db_connection)
+    query_api = db_connection.query_api
+    statements = STAGE_DURATION.count(stage="sql")
+    started = time.perf_counter()
+    with trace_report(f"{shape.devices}_{duration.replace(' ', '_')}", directory=trace_dir or ""):
+        generate_report.get_results(site_id, duration,
+                                    FLEET_SITE_NAME if site_id is None else f"Site {site_id}", filename,
+                                    report_type=report_type)
+    wall_s = time.perf_counter() - started
+    db_connection.close_connections()
+    shutdown_chart_pool()
+
+    return {"devices": shape.devices, "duration": duration, "wall_s": round(wall_s, 3),
+            "influx_queries": query_api.queries, "influx_rows": query_api.rows,
+            "sql_statements": STAGE_DURATION.count(stage="sql") - statements,
+            "peak_rss_mb": round(_peak_rss_mb(), 1), "output_bytes": os.path.getsize(filename)}
+
+
+def run_benchmarks(shapes, durations, report_type=None, site_id=None, directory=None, trace_dir=None):
+    directory = directory or tempfile.mkdtemp(prefix="report-bench-")
+    os.makedirs(directory, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for shape in shapes:
+        for duration in durations:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_scenario, shape, duration, report_type, site_id, directory,
+                                         trace_dir).result()
+            print(f"{result['devices']:>7} {result['duration']:<14} {result['wall_s']:>9.3f} "
+                  f"{result['influx_queries']:>8} {result['influx_rows']:>11} {result['sql_statements']:>6} "
+                  f"{result['peak_rss_mb']:>9.1f}", flush=True)
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark report generation on a synthetic fleet.")
+    parser.add_argument("--devices", type=int, nargs="+", default=DEFAULT_SIZES, help="fleet sizes to run")
+    parser.add_argument("--durations", nargs="+", default=DURATIONS, choices=DURATIONS, metavar="DURATION")
+    parser.add_argument("--devices-per-rack", type=int, default=20)
+    parser.add_argument("--sites", type=int, default=1)
+    parser.add_argument("--psus", type=int, default=2, help="PSU series per device")
+    parser.add_argument("--sample-every", type=int, default=60, help="raw sampling interval in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds injected per Flux query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-type", default=None, help='Reports.report_type, e.g. "json" or "compare"')
+    parser.add_argument("--site-id", type=int, default=None, help="one site instead of the fleet report")
+    parser.add_argument("--output-dir", default=None, help="where databases and reports are written")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--trace-dir", default=None, help="write each report's span tree here (see metrics.tracing)")
+    args = parser.parse_args(argv)
+
+    shapes = [FleetShape(devices=devices, devices_per_rack=args.devices_per_rack, sites=args.sites,
+                         psus_per_device=args.psus, sample_every_s=args.sample_every, latency_s=args.latency,
+                         seed=args.seed) for devices in args.devices]
+    print(f"{'devices':>7} {'duration':<14} {'wall (s)':>9} {'queries':>8} {'influx rows':>11} {'sql':>6} "
+          f"{'RSS (MB)':>9}")
+    results = run_benchmarks(shapes, args.durations, args.report_type, args.site_id, args.output_dir,
+                             args.trace_dir)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"shapes": [asdict(shape) for shape in shapes], "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
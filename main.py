@@ -6,69 +6,92 @@ from dotenv import load_dotenv
 
 from Database.db_connector import DBConnection
 from Models.model import Reports, Site
-from GenerateReport.generate import GenerateReport
+from GenerateReport.generate import FLEET_SITE_NAME, GenerateReport
+from report.exporters import output_extension
+from metrics.metrics import REPORT_QUEUE_DEPTH, REPORTS_COMPLETED, REPORTS_FAILED, start_metrics_server
+from metrics.logs import report_context, setup_logging
+from metrics.tracing import trace_report
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='ReportData.log',
-    filemode='a'
-)
-load_dotenv()
-report_dir = os.getenv('dir_path')
-logging.info(f"directory already exists at: {report_dir}")
+logger = logging.getLogger(__name__)
 
 class Reporting:
     def __init__(self):
+        self.report_dir = os.getenv('dir_path')
         self.db_connection = DBConnection()
         self.generate_report = GenerateReport()
 
     def get_pending_reports(self):
         with self.db_connection.session_scope() as session:
-            logging.info("Retrieving pending reports")
+            logger.info("Retrieving pending reports")
             try:
-                reports_path = os.path.join(report_dir, "reports")
+                reports_path = os.path.join(self.report_dir, "reports")
                 if not os.path.exists(reports_path):
                     os.makedirs(reports_path)
-                    logging.info(f"'reports' directory created at: {reports_path}")
+                    logger.info("'reports' directory created at: %s", reports_path)
                 else:
-                    logging.info(f"'reports' directory already exists at: {reports_path}")
+                    logger.info("'reports' directory already exists at: %s", reports_path)
                 results = []
                 pending_reports = session.query(Reports).filter(Reports.Status == False).all()
+                REPORT_QUEUE_DEPTH.set(len(pending_reports))
                 if pending_reports:
                     for report in pending_reports:
                         site_id = report.site_id
                         report_id = report.id
                         duration = report.duration
-                        site_name =  session.query(Site.site_name).filter(Site.id == site_id).first()[0]
+                        if site_id is None:
+                            site_name = FLEET_SITE_NAME
+                        else:
+                            site_name = session.query(Site.site_name).filter(Site.id == site_id).first()[0]
                         clean_duration = duration.replace(" ", "_").replace(":", "-")
-                        file_name = f"report_{report_id}_{clean_duration}.pdf"
+                        file_name = f"report_{report_id}_{clean_duration}{output_extension(report.report_type)}"
                         path = os.path.join(reports_path, file_name)
-                        print(path)
-                        logging.info(f"Processing report ID {report.id} with site_id {site_id} and duration {duration}")
-                        report_result = self.generate_report.get_results(site_id, duration,site_name,path)
-                        if report_result:
-                            report.path = file_name  # Save only the filename in the database
-                            report.Status = True  # Mark the report as processed
-                            report.message="Report Generated Successfully"
-                            session.commit()  # Commit changes to the database
-                            logging.info(f"Report ID {report_id} saved successfully at '{file_name}'")
-                        else:
-                            logging.warning(f"Report ID {report_id} generation failed.")
+                        with report_context(report_id, site_id):
+                            logger.info("Processing report ID %s with site_id %s and duration %s, writing %s",
+                                        report_id, site_id, duration, path)
+                            try:
+                                with trace_report(report_id, site_id=site_id, duration=duration,
+                                                  report_type=report.report_type):
+                                    report_result = self.generate_report.get_results(
+                                        site_id, duration, site_name, path, report_type=report.report_type)
+                            except Exception:
+                                REPORTS_FAILED.inc()
+                                raise
+                            finally:
+                                REPORT_QUEUE_DEPTH.dec()
+                            if report_result:
+                                report.path = file_name  # Save only the filename in the database
+                                report.Status = True  # Mark the report as processed
+                                report.message="Report Generated Successfully"
+                                session.commit()  # Commit changes to the database
+                                REPORTS_COMPLETED.inc()
+                                logger.info("Report ID %s saved successfully at '%s'", report_id, file_name)
+                            else:
+                                REPORTS_FAILED.inc()
+                                logger.warning("Report ID %s generation failed.", report_id)
                 else:
-                    print("No report is pending to generated")
+                    logger.info("No report is pending to generated")
                     # results.append(report_result)
 
             except Exception as e:
-                logging.error(f"An error occurred while fetching pending reports: {e}")
+                REPORT_QUEUE_DEPTH.set(0)
+                logger.exception("An error occurred while fetching pending reports: %s", e)
                 return []
 
-if __name__ == "__main__":
+def main():
+    # Only the daemon process configures itself: spawned chart workers re-import this module
+    load_dotenv()
+    setup_logging(filename='ReportData.log')
+    logger.info("directory already exists at: %s", os.getenv('dir_path'))
+    start_metrics_server()
     reporting = Reporting()
     try:
         while True:
             reporting.get_pending_reports()
-            logging.info("Waiting 1 minutes before next check...")
+            logger.info("Waiting 1 minutes before next check...")
             time.sleep(60)  # Wait for 2 minutes
     except KeyboardInterrupt:
-        logging.info("Report generation stopped by user.")
+        logger.info("Report generation stopped by user.")
+
+
+if __name__ == "__main__":
+    main()
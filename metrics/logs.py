@@ -0,0 +1,111 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMATS = ("text", "json")
+# Packages of this service; only their loggers go down to DEBUG for the sites in DEBUG_SITE_IDS
+APP_LOGGERS = ("__main__", "Database", "GenerateReport", "metrics", "power_data", "repo", "report")
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - [%(correlation_id)s site=%(site_id)s] %(name)s - %(message)s"
+
+_CORRELATION_ID = ContextVar("correlation_id", default="-")
+_SITE_ID = ContextVar("site_id", default=None)
+
+
+@contextmanager
+def report_context(report_id=None, site_id=None):
+    """Tag every record logged inside the block (and in futures submitted through submit_traced) with the
+    report's correlation ID, Reports.id when there is one, and its site."""
+    correlation_token = _CORRELATION_ID.set(str(report_id) if report_id is not None else uuid.uuid4().hex[:8])
+    site_token = _SITE_ID.set(site_id)
+    try:
+        yield
+    finally:
+        _CORRELATION_ID.reset(correlation_token)
+        _SITE_ID.reset(site_token)
+
+
+def debug_site_ids():
+    """Sites whose reports log at DEBUG, from DEBUG_SITE_IDS ("3,7"; "all" for every report)."""
+    value = os.getenv("DEBUG_SITE_IDS", "").strip()
+    if value.lower() == "all":
+        return "all"
+    return {int(site_id) for site_id in value.split(",") if site_id.strip()}
+
+
+class ReportContextFilter(logging.Filter):
+    """Adds the correlation ID and site to each record and drops DEBUG records of sites not being debugged."""
+
+    def __init__(self, level, debug_sites):
+        super().__init__()
+        self.level = level
+        self.debug_sites = debug_sites
+
+    def filter(self, record):
+        record.correlation_id = _CORRELATION_ID.get()
+        record.site_id = _SITE_ID.get()
+        if record.levelno >= self.level or self.debug_sites == "all":
+            return True
+        return record.site_id in self.debug_sites
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        document = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": record.correlation_id,
+            "site_id": record.site_id,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            document["exception"] = self.formatException(record.exc_info)
+        return json.dumps(document, default=str)
+
+
+class _Listener(QueueListener):
+    """QueueListener whose stop() may be called again, e.g. by the atexit hook after an explicit stop."""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(filename=None, level=None, log_format=None):
+    """Route the root logger through a queue to a listener thread that writes filename (stderr when None).
+
+    Logging calls only enqueue the record, so report threads never wait on the file. Levels below
+    LOG_LEVEL are dropped before any formatting, except for the sites in DEBUG_SITE_IDS.
+    """
+    level = logging.getLevelName((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unsupported log level: {level}")
+    log_format = log_format or os.getenv("LOG_FORMAT", "text")
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unsupported log format: {log_format}")
+    debug_sites = debug_site_ids()
+
+    handler = logging.FileHandler(filename, mode="a") if filename else logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(ReportContextFilter(level, debug_sites))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    if debug_sites:
+        # Records below the level are only created where some site may want them; the filter drops the rest
+        for name in APP_LOGGERS:
+            logging.getLogger(name).setLevel(logging.DEBUG)
+    listener = _Listener(records, handler)
+    listener.start()
+    # Flush what is still queued when the daemon exits
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,252 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics.tracing import span
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Stage latencies range from a few ms (single SQL statement) to minutes (doc.build of a fleet appendix)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+               for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "unknown"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+        if not self.label_names and self.metric_type in ("counter", "gauge"):
+            self._values[()] = 0
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.label_names)
+
+    def header(self):
+        return [f"# TYPE {self.name} {self.metric_type}", f"# HELP {self.name} {self.documentation}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}_total{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+            return counts[-1]
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REPORT_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "report_queue_depth", "Pending reports still waiting to be generated in the current poll."))
+REPORTS_COMPLETED = REGISTRY.register(Counter(
+    "reports_completed", "Reports generated and marked as processed."))
+REPORTS_FAILED = REGISTRY.register(Counter(
+    "reports_failed", "Reports whose generation returned no result or raised."))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "report_stage_duration_seconds", "Wall time spent per report generation stage.", ("stage",)))
+INFLUX_QUERIES = REGISTRY.register(Counter(
+    "influx_queries", "Flux queries issued, by repository method.", ("method",)))
+INFLUX_ROWS = REGISTRY.register(Counter(
+    "influx_rows_returned", "Rows returned by Flux queries, by repository method.", ("method",)))
+CACHE_HITS = REGISTRY.register(Counter("cache_hits", "Cache lookups served from the cache.", ("cache",)))
+CACHE_MISSES = REGISTRY.register(Counter("cache_misses", "Cache lookups that had to be computed.", ("cache",)))
+
+
+class _CacheHitRatio(Gauge):
+    """Derived at scrape time from the hit/miss counters so it never drifts from them."""
+
+    def collect(self):
+        with CACHE_HITS._lock:
+            hits = dict(CACHE_HITS._values)
+        with CACHE_MISSES._lock:
+            misses = dict(CACHE_MISSES._values)
+        with self._lock:
+            self._values = {}
+            for key in set(hits) | set(misses):
+                lookups = hits.get(key, 0) + misses.get(key, 0)
+                self._values[key] = hits.get(key, 0) / lookups if lookups else 0
+        return super().collect()
+
+
+CACHE_HIT_RATIO = REGISTRY.register(_CacheHitRatio(
+    "cache_hit_ratio", "Fraction of cache lookups served from the cache.", ("cache",)))
+
+
+@contextmanager
+def observe_stage(stage):
+    """Time the enclosed block into the stage latency histogram, and as a span of the current report trace."""
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed_stage(stage):
+    """Decorator form of observe_stage for repository methods."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_influx_query(method, rows):
+    INFLUX_QUERIES.inc(method=method)
+    INFLUX_ROWS.inc(rows, method=method)
+
+
+def record_cache_lookup(cache, hit):
+    if hit:
+        CACHE_HITS.inc(cache=cache)
+    else:
+        CACHE_MISSES.inc(cache=cache)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every 15s would otherwise flood ReportData.log
+        pass
+
+
+def start_metrics_server(host=None, port=None):
+    """Serve /metrics from a daemon thread. Disabled when METRICS_PORT is unset or 0."""
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    port = int(port if port is not None else os.getenv("METRICS_PORT", "0") or 0)
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info("Metrics endpoint listening on http://%s:%s/metrics", host, port)
+    return server
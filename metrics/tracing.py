@@ -0,0 +1,228 @@
+"""Per-report span trees.
+
+Every report run under trace_report() collects spans for its stages (futures, repository methods,
+Flux queries, SQL statements, charts, doc.build) and writes them to TRACE_DIR/report_<Reports.id>.jsonl.
+Outside a traced report every helper is a no-op.
+
+    python -m metrics.tracing 42
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+_TRACE = ContextVar("trace", default=None)
+_PARENT = ContextVar("span_parent", default=None)
+
+# Span names of single queries, listed by the CLI
+QUERY_SPANS = ("flux", "sql")
+
+
+def normalize_query(query: str) -> str:
+    """The query with indentation and line breaks collapsed, so formatting changes keep its hash."""
+    return " ".join(query.split())
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha1(normalize_query(query).encode()).hexdigest()
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start", "duration_s", "thread", "attrs", "_started")
+
+    def __init__(self, name, span_id, parent_id, attrs):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration_s = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        self.duration_s = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {"span_id": self.span_id, "parent_id": self.parent_id, "name": self.name, "start": self.start,
+                "duration_s": self.duration_s, "thread": self.thread, **self.attrs}
+
+
+class _NoSpan:
+    """Stands in for a span outside a traced report; falsy so callers can skip computing attributes."""
+
+    def set(self, **attrs):
+        pass
+
+    def __bool__(self):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    def __init__(self, report_id):
+        self.report_id = report_id
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def open(self, name, parent_id, attrs) -> Span:
+        with self._lock:
+            span = Span(name, next(self._ids), parent_id, attrs)
+            self.spans.append(span)
+        return span
+
+    def write(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = trace_path(directory, self.report_id)
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        with open(path, "w") as file:
+            for span in spans:
+                file.write(json.dumps({"report_id": self.report_id, **span.to_dict()}, default=str) + "\n")
+        return path
+
+
+def trace_path(directory: str, report_id) -> str:
+    return os.path.join(directory, f"report_{report_id}.jsonl")
+
+
+@contextmanager
+def trace_report(report_id, directory=None, **attrs):
+    """Trace everything run inside the block as the span tree of one report.
+
+    Written to directory (TRACE_DIR by default) when the block exits, also on failure. Disabled when
+    no directory is configured.
+    """
+    directory = directory if directory is not None else os.getenv("TRACE_DIR", "")
+    if not directory:
+        yield None
+        return
+    trace = Trace(report_id)
+    trace_token = _TRACE.set(trace)
+    try:
+        with span("report", **attrs) as root:
+            try:
+                yield trace
+            except BaseException as e:
+                root.set(error=repr(e))
+                raise
+    finally:
+        _TRACE.reset(trace_token)
+        trace.write(directory)
+
+
+@contextmanager
+def span(name, **attrs):
+    """A child span of the current one for the enclosed block; yields NO_SPAN outside a traced report."""
+    trace = _TRACE.get()
+    if trace is None:
+        yield NO_SPAN
+        return
+    current = trace.open(name, _PARENT.get(), attrs)
+    parent_token = _PARENT.set(current.span_id)
+    try:
+        yield current
+    finally:
+        _PARENT.reset(parent_token)
+        current.finish()
+
+
+def start_span(name, **attrs):
+    """Open a leaf span for work bracketed by callbacks (e.g. SQL cursor events); None when not tracing."""
+    trace = _TRACE.get()
+    return None if trace is None else trace.open(name, _PARENT.get(), attrs)
+
+
+def end_span(current, **attrs):
+    if current is not None:
+        current.set(**attrs)
+        current.finish()
+
+
+def current_context():
+    """The trace and parent span at this point, for spans recorded later from another thread."""
+    return _TRACE.get(), _PARENT.get()
+
+
+def record_span(context, name, duration_s, **attrs):
+    """Add a span that ended now and lasted duration_s under a context captured by current_context()."""
+    trace, parent_id = context
+    if trace is None:
+        return
+    recorded = trace.open(name, parent_id, attrs)
+    recorded.start = time.time() - duration_s
+    recorded.duration_s = duration_s
+
+
+def _run_in_span(name, fn, args, kwargs):
+    with span(name):
+        return fn(*args, **kwargs)
+
+
+def submit_traced(executor, name, fn, *args, **kwargs):
+    """executor.submit running fn in a span named name, under the submitting thread's current span."""
+    return executor.submit(copy_context().run, _run_in_span, name, fn, args, kwargs)
+
+
+def load_trace(path: str) -> list:
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def critical_path(spans: list) -> list:
+    """From the root down, the child that finished last at every level: the chain that set the report's wall time."""
+    children = {}
+    for recorded in spans:
+        children.setdefault(recorded["parent_id"], []).append(recorded)
+    path = []
+    level = children.get(None, [])
+    while level:
+        last = max(level, key=lambda recorded: recorded["start"] + (recorded["duration_s"] or 0))
+        path.append(last)
+        level = children.get(last["span_id"], [])
+    return path
+
+
+def slowest_queries(spans: list, k: int = 10) -> list:
+    queries = [recorded for recorded in spans if recorded["name"] in QUERY_SPANS]
+    return sorted(queries, key=lambda recorded: recorded["duration_s"] or 0, reverse=True)[:k]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Critical path and slowest queries of a traced report.")
+    parser.add_argument("report", help="Reports.id, or the path of a trace file")
+    parser.add_argument("--dir", default=os.getenv("TRACE_DIR", ""), help="trace directory (TRACE_DIR)")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest queries listed")
+    args = parser.parse_args(argv)
+
+    path = args.report if os.path.exists(args.report) else trace_path(args.dir, args.report)
+    spans = load_trace(path)
+    path_spans = critical_path(spans)
+    if path_spans:
+        print(f"Report {path_spans[0]['report_id']}: {path_spans[0]['duration_s']:.3f}s, {len(spans)} spans")
+    print("Critical path:")
+    for depth, recorded in enumerate(path_spans):
+        print(f"  {recorded['duration_s']:>9.3f}s  {'  ' * depth}{recorded['name']}")
+    print("Slowest queries:")
+    for recorded in slowest_queries(spans, args.top):
+        if recorded["name"] == "flux":
+            detail = f"{recorded.get('method')}  {recorded.get('query_hash', '')[:12]}  " \
+                     f"rows={recorded.get('rows')}  bytes={recorded.get('bytes')}"
+        else:
+            detail = f"rows={recorded.get('rows')}  {recorded.get('statement', '')}"
+        print(f"  {recorded['duration_s']:>9.3f}s  {recorded['name']:<4}  {detail}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from power_data.dataset import ENERGY_COLUMNS, RACK_COLUMNS, RACK_SERIES_COLUMNS, SITE_COLUMNS
+from power_data.report_type import report_type_options
+
+POWER_COLUMNS = ["total_PIn", "total_POut"]
+# Per-device bucket frame produced by InfluxdbRepository.get_device_energy_buckets
+BUCKET_COLUMNS = ["ip", "time"] + POWER_COLUMNS + ["total_bytesRateLast"]
+# Per-device range sums produced by InfluxdbRepository.get_device_totals
+DEVICE_TOTAL_COLUMNS = POWER_COLUMNS + ["total_bytesRateLast"]
+# Input power percentiles reported per device and per rack, besides the max
+POWER_PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+ENERGY_BREAKDOWNS = ("device", "rack")
+
+
+class SiteEnergy(NamedTuple):
+    """Everything derived from one fetch of a site's per-device energy buckets."""
+    energy: pd.DataFrame
+    breakdown: Optional[pd.DataFrame]
+    device_emissions: pd.DataFrame
+    rack_emissions: pd.Series
+    # Per-site summary, only for a fleet (all sites) report
+    sites: Optional[pd.DataFrame] = None
+    rack_series: Optional[pd.DataFrame] = None
+
+    @property
+    def co2_kg(self) -> float:
+        return float(self.device_emissions["co2_kg"].sum())
+
+
+def energy_breakdown_for_report_type(report_type: Optional[str]) -> Optional[str]:
+    """Breakdown ("device" or "rack") named anywhere in Reports.report_type, if any."""
+    return report_type_options(report_type).get("breakdown")
+
+
+def efficiency_metrics(totals: pd.DataFrame) -> pd.DataFrame:
+    """Add EER (POut/PIn) and PUE (PIn/POut) per row; a row with no input or output power scores 0."""
+    pin = totals["total_PIn"].to_numpy(dtype=float)
+    pout = totals["total_POut"].to_numpy(dtype=float)
+    totals = totals.copy()
+    totals["energy_efficiency"] = np.divide(pout, pin, out=np.zeros_like(pout), where=pin > 0).round(2)
+    totals["power_efficiency"] = np.divide(pin, pout, out=np.zeros_like(pin), where=pout > 0).round(2)
+    totals["total_PIn"] = pin.round(2)
+    totals["total_POut"] = pout.round(2)
+    return totals
+
+
+def site_energy(buckets: pd.DataFrame) -> pd.DataFrame:
+    """Site trend: input and output power summed over every device in each bucket, then EER/PUE."""
+    totals = buckets.groupby("time", sort=True)[POWER_COLUMNS].sum().reset_index()
+    return efficiency_metrics(totals)[ENERGY_COLUMNS]
+
+
+def energy_breakdown(buckets: pd.DataFrame, groups: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Trend per device, or per group when `groups` maps "ip" to group columns (e.g. rack_id, rack_name).
+
+    A device mapped to several groups counts toward each of them, as rack KPIs do.
+    """
+    keys = ["ip"]
+    if groups is not None:
+        keys = [column for column in groups.columns if column != "ip"]
+        buckets = buckets.merge(groups.drop_duplicates(), on="ip")
+    totals = buckets.groupby(keys + ["time"], sort=True)[POWER_COLUMNS].sum().reset_index()
+    return efficiency_metrics(totals)
+
+
+def rack_series(buckets: pd.DataFrame, rack_ips: pd.DataFrame) -> pd.DataFrame:
+    """Per-rack trend: each rack's devices summed per bucket, then EER/PUE and traffic speed (Mbps)."""
+    merged = buckets.merge(rack_ips[["ip", "rack_id", "rack_name"]].drop_duplicates(), on="ip")
+    totals = merged.groupby(["rack_id", "rack_name", "time"], sort=True)[DEVICE_TOTAL_COLUMNS].sum().reset_index()
+    totals["traffic_speed"] = (totals.pop("total_bytesRateLast") * 8 / 1e6).round(2)  # bytes/sec to Mbps
+    return efficiency_metrics(totals)[RACK_SERIES_COLUMNS]
+
+
+def site_summary(buckets: pd.DataFrame, emissions: pd.DataFrame, device_sites: pd.DataFrame) -> pd.DataFrame:
+    """Per-site EER/PUE over the whole range, energy (kWh) and CO2 (kg) for a fleet report, biggest emitter first.
+
+    `device_sites` maps each device "ip" to its site_id and site_name; every site gets a row, even a silent one.
+    """
+    keys = ["site_id", "site_name"]
+    groups = device_sites[["ip"] + keys].drop_duplicates()
+    num_devices = device_sites.groupby(keys, dropna=False).size().rename("num_devices")
+    power = buckets.merge(groups, on="ip").groupby(keys, dropna=False)[POWER_COLUMNS].sum()
+    energy = emissions.merge(groups, on="ip").groupby(keys, dropna=False)[["energy_kwh", "co2_kg"]].sum()
+
+    summary = pd.concat([num_devices, power, energy], axis=1).fillna(0).reset_index()
+    summary = efficiency_metrics(summary)
+    summary[["energy_kwh", "co2_kg"]] = summary[["energy_kwh", "co2_kg"]].round(2)
+    summary = summary.sort_values(["co2_kg", "energy_kwh"], ascending=False, kind="stable")
+    return summary.reindex(columns=SITE_COLUMNS).reset_index(drop=True)
+
+
+def rack_kpis(racks: pd.DataFrame, rack_ips: pd.DataFrame, totals: pd.DataFrame,
+              percentiles: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Rack table from per-device range totals (indexed by ip): each rack sums the devices mapped to it.
+
+    EER is POut/PIn and PUE is PIn/POut - 1 over those sums; power is in kW, traffic in GB. `percentiles`
+    (power_p50 ... power_max in W, indexed by rack_id) become the power_p50_kw ... power_max_kw columns.
+    """
+    per_rack = rack_ips.merge(totals, left_on="ip", right_index=True).groupby("rack_id")[DEVICE_TOTAL_COLUMNS].sum()
+    frame = racks.merge(per_rack, left_on="rack_id", right_index=True, how="left")
+    pin, pout, traffic = (frame[column].fillna(0).to_numpy(dtype=float) for column in DEVICE_TOTAL_COLUMNS)
+
+    frame["eer"] = np.divide(pout, pin, out=np.zeros_like(pout), where=pin > 0).round(2)
+    frame["pue"] = (np.divide(pin, pout, out=np.ones_like(pin), where=pout > 0) - 1).round(2)
+    frame["power_input_kw"] = (pin / 1000).round(2)
+    frame["power_output_kw"] = (pout / 1000).round(2)
+    frame["data_traffic_gb"] = (traffic / 1024 ** 3).round(2)
+    gb = frame["data_traffic_gb"].to_numpy()
+    frame["pcr"] = np.divide(frame["power_input_kw"].to_numpy() * 1000, gb, out=np.zeros_like(gb),
+                             where=gb > 0).round(4)
+    if percentiles is not None:
+        for column in percentiles.columns:
+            frame[f"{column}_kw"] = (frame["rack_id"].map(percentiles[column]) / 1000).round(2)
+    return frame.reindex(columns=RACK_COLUMNS)
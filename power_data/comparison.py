@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from power_data.dataset import COMPARISON_COLUMNS, MOVEMENT_COLUMNS
+from power_data.report_type import report_type_options
+
+# Durations compared with the same dates a year earlier; every other one with the window just before it
+YEAR_DURATIONS = ("Current Year", "Last Year")
+
+
+class PeriodSummary(NamedTuple):
+    """Site KPIs of one period: average EER/PUE over its trend, and energy/CO2 per device."""
+    eer: float
+    pue: float
+    devices: pd.DataFrame  # ip, energy_kwh, co2_kg
+
+    @property
+    def energy_kwh(self) -> float:
+        return float(self.devices["energy_kwh"].sum())
+
+    @property
+    def co2_kg(self) -> float:
+        return float(self.devices["co2_kg"].sum())
+
+
+def comparison_for_report_type(report_type: Optional[str]) -> bool:
+    """True when Reports.report_type names a comparison anywhere, e.g. "Energy Report (compare)"."""
+    return "comparison" in report_type_options(report_type)
+
+
+def previous_period(start: datetime, end: datetime, duration_str: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """The window [start, end) is compared with.
+
+    Year ranges step back one year, so year-to-date compares with the same dates of the year before; every
+    other range with the window of its length that ends where it starts.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if duration_str in YEAR_DURATIONS:
+        return start - pd.DateOffset(years=1), end - pd.DateOffset(years=1)
+    return start - (end - start), start
+
+
+def period_summary(energy: pd.DataFrame, emissions: pd.DataFrame) -> PeriodSummary:
+    return PeriodSummary(float(energy["energy_efficiency"].mean()) if len(energy) else 0.0,
+                         float(energy["power_efficiency"].mean()) if len(energy) else 0.0,
+                         emissions[["ip", "energy_kwh", "co2_kg"]])
+
+
+def compare_periods(current: PeriodSummary, previous: PeriodSummary) -> pd.DataFrame:
+    """One row per KPI: current and previous value, absolute change and change in % of the previous value."""
+    metrics = ["eer", "pue", "energy_kwh", "co2_kg"]
+    now = np.array([getattr(current, metric) for metric in metrics], dtype=float)
+    before = np.array([getattr(previous, metric) for metric in metrics], dtype=float)
+    change = now - before
+    change_pct = np.divide(change * 100, before, out=np.full_like(change, np.nan), where=before != 0)
+    return pd.DataFrame({"metric": metrics, "current": now.round(2), "previous": before.round(2),
+                         "change": change.round(2), "change_pct": change_pct.round(1)})[COMPARISON_COLUMNS]
+
+
+def device_movements(current: PeriodSummary, previous: PeriodSummary, names: pd.Series, k: int = 5) -> pd.DataFrame:
+    """The current top k devices by energy with their rank in the previous period.
+
+    rank_change is positive for a device that climbed; previous_rank is empty for a device silent before.
+    """
+    now = current.devices.set_index("ip")["energy_kwh"]
+    before = previous.devices.set_index("ip")["energy_kwh"]
+    rank = now.rank(ascending=False, method="first")
+    previous_rank = before.rank(ascending=False, method="first")
+
+    top = rank.nsmallest(k).index
+    movements = pd.DataFrame({
+        "ip_address": top,
+        "device_name": names.reindex(top).to_numpy(),
+        "rank": rank.reindex(top).to_numpy(),
+        "previous_rank": previous_rank.reindex(top).to_numpy(),
+        "energy_kwh": now.reindex(top).round(2).to_numpy(),
+        "previous_energy_kwh": before.reindex(top).round(2).to_numpy(),
+    })
+    movements["rank_change"] = movements["previous_rank"] - movements["rank"]
+    return movements[MOVEMENT_COLUMNS]
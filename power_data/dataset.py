@@ -0,0 +1,126 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from power_data.quantity import Quantity
+
+ENERGY_COLUMNS = ["time", "energy_efficiency", "total_POut", "total_PIn", "power_efficiency"]
+DEVICE_COLUMNS = ["id", "device_name", "ip_address", "total_power", "total_bandwidth", "traffic_speed",
+                  "bandwidth_utilization", "pcr", "co2emmissions", "power_p50", "power_p95", "power_p99", "power_max"]
+RACK_COLUMNS = ["rack_id", "rack_name", "building", "site_name", "num_devices", "eer", "pue", "power_input_kw",
+                "power_output_kw", "data_traffic_gb", "co2", "pcr", "power_p50_kw", "power_p95_kw", "power_p99_kw",
+                "power_max_kw"]
+RACK_SERIES_COLUMNS = ["rack_id", "rack_name", "time", "total_PIn", "total_POut", "energy_efficiency",
+                       "power_efficiency", "traffic_speed"]
+SITE_COLUMNS = ["site_id", "site_name", "num_devices", "energy_efficiency", "power_efficiency", "energy_kwh", "co2_kg",
+                "top_device"]
+COMPARISON_COLUMNS = ["metric", "current", "previous", "change", "change_pct"]
+MOVEMENT_COLUMNS = ["ip_address", "device_name", "rank", "previous_rank", "rank_change", "energy_kwh",
+                    "previous_energy_kwh"]
+# Columns holding text in any section; every other column is a number or, for "time", a timestamp
+TEXT_COLUMNS = {"ip", "ip_address", "device_name", "rack_name", "building", "site_name", "top_device", "metric"}
+
+# Every section holds raw floats; these are the units they are stored in (utilization is %, ratios unitless)
+COLUMN_UNITS = {
+    "total_PIn": "W",
+    "total_POut": "W",
+    "total_power": "W",
+    "total_bandwidth": "Mbps",
+    "traffic_speed": "Mbps",
+    "co2emmissions": "kg",
+    "power_p50": "W",
+    "power_p95": "W",
+    "power_p99": "W",
+    "power_max": "W",
+    "power_input_kw": "kW",
+    "power_output_kw": "kW",
+    "data_traffic_gb": "GB",
+    "co2": "kg",
+    "power_p50_kw": "kW",
+    "power_p95_kw": "kW",
+    "power_p99_kw": "kW",
+    "power_max_kw": "kW",
+    "energy_kwh": "kWh",
+    "previous_energy_kwh": "kWh",
+    "co2_kg": "kg",
+}
+
+
+def column_quantity(frame: pd.DataFrame, column: str) -> Quantity:
+    return Quantity(frame[column].to_numpy(dtype=float), COLUMN_UNITS[column])
+
+
+def columnar(frame: pd.DataFrame, columns) -> pd.DataFrame:
+    """Frame with exactly `columns`, text held as Arrow strings so it pickles as flat buffers.
+
+    Only TEXT_COLUMNS become strings; any other untyped column (e.g. of an empty section) becomes
+    datetime64 for "time" and float64 otherwise, so every section keeps its column types.
+    """
+    frame = frame.reindex(columns=columns)
+    for column in frame.columns:
+        if column in TEXT_COLUMNS:
+            frame[column] = frame[column].astype("string[pyarrow]")
+        elif frame[column].dtype == object:
+            frame[column] = pd.to_datetime(frame[column]) if column == "time" else frame[column].astype(float)
+    return frame
+
+
+@dataclass
+class ReportDataset:
+    """Everything one report needs, fetched once and read by the PDF renderer and every exporter.
+
+    Each section is a column-typed DataFrame (datetime64/float64 series, Arrow strings), so the
+    dataset pickles cheaply to chart workers or a cache without any per-row Python objects.
+    """
+    site_name: str
+    duration: str
+    energy: pd.DataFrame
+    top_devices: pd.DataFrame
+    bottom_devices: pd.DataFrame
+    racks: pd.DataFrame
+    summary: Dict[str, int] = field(default_factory=dict)
+    # Per-device or per-rack EER/PUE trend, only when the report asks for a breakdown
+    energy_breakdown: Optional[pd.DataFrame] = None
+    # One row per site, only in a fleet (all sites) report
+    sites: Optional[pd.DataFrame] = None
+    # Per-rack EER/PUE/traffic per report bucket
+    rack_series: Optional[pd.DataFrame] = None
+    # KPI deltas and top-device rank movements against the previous equivalent period, when requested
+    comparison: Optional[pd.DataFrame] = None
+    device_movements: Optional[pd.DataFrame] = None
+    previous_period: Optional[Tuple[pd.Timestamp, pd.Timestamp]] = None
+
+    def __post_init__(self):
+        self.energy = columnar(self.energy, ENERGY_COLUMNS)
+        self.top_devices = columnar(self.top_devices, DEVICE_COLUMNS)
+        self.bottom_devices = columnar(self.bottom_devices, DEVICE_COLUMNS)
+        self.racks = columnar(self.racks, RACK_COLUMNS)
+        if self.energy_breakdown is not None:
+            self.energy_breakdown = columnar(self.energy_breakdown, self.energy_breakdown.columns)
+        if self.sites is not None:
+            self.sites = columnar(self.sites, SITE_COLUMNS)
+        if self.rack_series is not None:
+            self.rack_series = columnar(self.rack_series, RACK_SERIES_COLUMNS)
+        if self.comparison is not None:
+            self.comparison = columnar(self.comparison, COMPARISON_COLUMNS)
+            self.device_movements = columnar(self.device_movements, MOVEMENT_COLUMNS)
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        tables = {
+            "energy": self.energy,
+            "top_devices": self.top_devices,
+            "bottom_devices": self.bottom_devices,
+            "racks": self.racks,
+            "summary": pd.DataFrame({"metric": list(self.summary.keys()), "value": list(self.summary.values())}),
+        }
+        if self.energy_breakdown is not None:
+            tables["energy_breakdown"] = self.energy_breakdown
+        if self.sites is not None:
+            tables["sites"] = self.sites
+        if self.rack_series is not None:
+            tables["rack_series"] = self.rack_series
+        if self.comparison is not None:
+            tables["comparison"] = self.comparison
+            tables["device_movements"] = self.device_movements
+        return tables
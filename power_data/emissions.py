@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# gCO2eq/kWh applied when the grid zone has no carbon intensity readings for the whole range
+DEFAULT_CARBON_INTENSITY = 404.1
+
+EMISSION_COLUMNS = ["ip", "energy_kwh", "co2_kg"]
+
+
+def bucket_hours(times, period: str, start: datetime, end: datetime) -> np.ndarray:
+    """Hours of the report bucket starting at each time that fall inside [start, end).
+
+    The first and last buckets of a range are usually partial (e.g. "7 Days" ending at 16:40), and a
+    bucket's mean power only covers its part of the queried range, so only that part is charged.
+    """
+    periods = pd.PeriodIndex(pd.DatetimeIndex(times), freq=period)
+    bucket_start = np.maximum(periods.start_time, pd.Timestamp(start))
+    bucket_end = np.minimum((periods + 1).start_time, pd.Timestamp(end))
+    return np.clip(np.asarray((bucket_end - bucket_start) / pd.Timedelta(hours=1), dtype=float), 0, None)
+
+
+def align_intensity(times, intensity: pd.DataFrame) -> np.ndarray:
+    """Carbon intensity for each (sorted) bucket time: the nearest reading in time, as-of joined."""
+    if intensity.empty:
+        return np.full(len(times), DEFAULT_CARBON_INTENSITY)
+    left = pd.DataFrame({"time": np.asarray(times, dtype="datetime64[ns]")})
+    right = pd.DataFrame({
+        "time": intensity["time"].to_numpy(dtype="datetime64[ns]"),
+        "carbon_intensity": intensity["carbon_intensity"].to_numpy(dtype=float),
+    }).dropna().sort_values("time")
+    if right.empty:
+        return np.full(len(times), DEFAULT_CARBON_INTENSITY)
+    return pd.merge_asof(left, right, on="time", direction="nearest")["carbon_intensity"].to_numpy()
+
+
+def device_emissions(buckets: pd.DataFrame, intensity: pd.DataFrame, period: str, start: datetime,
+                     end: datetime) -> pd.DataFrame:
+    """Energy (kWh) and CO2 (kg) per device over the report range [start, end).
+
+    Each bucket contributes its mean input power x its hours inside the range x the grid intensity of that bucket,
+    so a long range is weighted by when the power was drawn rather than by one average intensity.
+    """
+    if buckets.empty:
+        return pd.DataFrame(columns=EMISSION_COLUMNS)
+    times, position = np.unique(buckets["time"].to_numpy(dtype="datetime64[ns]"), return_inverse=True)
+    hours = bucket_hours(times, period, start, end)
+    kg_per_watt = hours * align_intensity(times, intensity) / 1e6
+    pin = buckets["total_PIn"].to_numpy(dtype=float)
+    per_bucket = pd.DataFrame({
+        "ip": buckets["ip"].to_numpy(),
+        "energy_kwh": pin * hours[position] / 1000,
+        "co2_kg": pin * kg_per_watt[position],
+    })
+    return per_bucket.groupby("ip", sort=False).sum().reset_index()
+
+
+def zoned_emissions(buckets: pd.DataFrame, zone_of_ip: pd.Series, intensities: Dict[str, pd.DataFrame],
+                    period: str, start: datetime, end: datetime) -> pd.DataFrame:
+    """device_emissions for devices on different grids: each zone's devices use that zone's intensity."""
+    zones = buckets["ip"].map(zone_of_ip)
+    parts = [device_emissions(buckets[zones == zone], intensity, period, start, end)
+             for zone, intensity in intensities.items()]
+    parts = [part for part in parts if not part.empty]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=EMISSION_COLUMNS)
+
+
+def group_emissions(emissions: pd.DataFrame, groups: pd.DataFrame, key: str) -> pd.Series:
+    """CO2 (kg) per group, e.g. rack_id, counting a device toward every group it is mapped to."""
+    merged = emissions.merge(groups[["ip", key]].drop_duplicates(), on="ip")
+    return merged.groupby(key)["co2_kg"].sum()
+
+
+def with_emissions(frame: pd.DataFrame, key: str, column: str, co2: pd.Series) -> pd.DataFrame:
+    """Copy of frame with `column` set from co2 (indexed by frame[key]); rows without data get 0."""
+    return frame.assign(**{column: frame[key].map(co2).fillna(0).to_numpy(dtype=float)})
@@ -1,26 +1,49 @@
 import logging
-import sys
 from datetime import timedelta, datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List
+from typing import Optional, Tuple
 
-from sqlalchemy import func
+import pandas as pd
+
+from sqlalchemy import case, func
 
 from Database.db_connector import DBConnection
 
-from Models.model import Device, Rack, Building,rack_building_association,DeviceInventory,Site
+from Models.model import Device, Rack
 from repo.site_repository import SiteRepository
+from metrics.tracing import submit_traced
+from power_data.aggregation import (ENERGY_BREAKDOWNS, SiteEnergy, energy_breakdown, rack_kpis, rack_series,
+                                    site_energy, site_summary)
+from power_data.comparison import PeriodSummary, period_summary, previous_period
+from power_data.emissions import EMISSION_COLUMNS, group_emissions, zoned_emissions
+from power_data.dataset import ENERGY_COLUMNS
+from power_data.quantity import Quantity
+from power_data.ranking import DEFAULT_RANK_METRIC, rank_devices
+from power_data.rollups import BucketRollupService, get_bucket_rollup_service
+from power_data.zone_data import DEFAULT_ZONE, ZoneDataService, get_zone_data_service
+
+from repo.influxdb_repository import BUCKET_PERIODS, InfluxdbRepository  # Assuming InfluxdbRepository is defined elsewhere
+
+logger = logging.getLogger(__name__)
 
-from repo.influxdb_repository import InfluxdbRepository  # Assuming InfluxdbRepository is defined elsewhere
 
 class PowerData:
-    def __init__(self):
-        self.site_repository = SiteRepository()
-        self.db_connection = DBConnection()
-        self.influxdb_repository = InfluxdbRepository()  # Assuming InfluxdbRepository is defined elsewhere
+    def __init__(self, db_connection=None, clock=None):
+        self.site_repository = SiteRepository(db_connection)
+        self.db_connection = db_connection or DBConnection()
+        self.influxdb_repository = InfluxdbRepository(db_connection)  # Assuming InfluxdbRepository is defined elsewhere
+        if db_connection is None:
+            self.zone_data = get_zone_data_service()
+            self.bucket_rollups = get_bucket_rollup_service()
+        else:
+            # An injected connection (benchmarks) gets caches of its own rather than the daemon-wide ones
+            self.zone_data = ZoneDataService(self.influxdb_repository)
+            self.bucket_rollups = BucketRollupService(self.influxdb_repository)
+        # Report ranges end at clock(); record/replay pins it so the same Flux ranges are issued again
+        self.clock = clock or datetime.today
 
     def calculate_start_end_dates(self, duration_str: str) -> (datetime, datetime):
-        today = datetime.today()
+        today = self.clock()
 
         if duration_str == "First Quarter":
             duration_str = "Last 3 Months"
@@ -61,30 +84,22 @@ class PowerData:
 
         return start_date, end_date
     def get_ips(self,site_id):
-        with self.db_connection.session_scope() as session:
-            devices = self.site_repository.get_devices_by_site_id(site_id)
+        # site_id None: every site's devices, for a fleet report
+        return self.site_repository.get_device_sites(site_id)["ip"].unique().tolist()
 
-            # Attach to session
-            devices = [session.merge(device) for device in devices]
+    def get_zone(self, site_id) -> str:
+        return self.site_repository.get_site_zone(site_id) or DEFAULT_ZONE
 
-            device_ips = [device.ip_address for device in devices if device.ip_address]
-            return device_ips
+    @staticmethod
+    def zone_of_ip(device_sites: pd.DataFrame) -> pd.Series:
+        return device_sites.drop_duplicates("ip").set_index("ip")["zone"].fillna(DEFAULT_ZONE)
 
-    def get_unit(self,carbon_emission_KG):
-         if carbon_emission_KG < 1000:
-             return "kg",round(carbon_emission_KG,4)
-         else:
-             carbon_emission=round((carbon_emission_KG / 1000), 4)
-             return "ton",carbon_emission
     def calculate_carbon_car(self, carbon_emission_KG):
-
-        car_trips = carbon_emission_KG * 1.39
-
-        base_distance = 1000
-        distance_per_trip = base_distance + (carbon_emission_KG * 10)
-        unit, carbon_emission = self.get_unit(carbon_emission_KG)
-
-        return f"{carbon_emission}{unit} is Equivalent of {int(car_trips)} car trips of {int(distance_per_trip)} km each in a gas-powered passenger vehicle"
+        # Equivalent gas-powered passenger car trips
+        return {
+            "car_trips": int(carbon_emission_KG * 1.39),
+            "distance_per_trip_km": int(1000 + carbon_emission_KG * 10),
+        }
 
     def calculate_carbon_solution(self, carbon_emission_KG):
         trees_needed = carbon_emission_KG / 0.021 / 12
@@ -96,11 +111,8 @@ class PowerData:
         }
 
     def calculate_carbon_flight(self, carbon_emission_KG):
-        flight_hours = carbon_emission_KG * 0.11 * 5.5
-        hours = int(flight_hours)
-        minutes = int((flight_hours - hours) * 60)
-        unit, carbon_emission = self.get_unit(carbon_emission_KG)
-        return f"{carbon_emission}{unit} is equivalent to {hours} hours and {minutes} minutes of flight time."
+        # Equivalent flight time
+        return {"flight_hours": carbon_emission_KG * 0.11 * 5.5}
 
     def calculate_total_power_consumption(self, site_id: int, duration_str: str):
         start_date, end_date = self.calculate_start_end_dates(duration_str)
@@ -110,10 +122,10 @@ class PowerData:
 
         with ThreadPoolExecutor(max_workers=2) as executor:
             futures = {
-                executor.submit(self.influxdb_repository.get_total_pin_value, device_ips, start_date, end_date,
-                                duration_str): "total_pin",
-                executor.submit(self.influxdb_repository.get_consumption_percentages, start_date, end_date,
-                                duration_str): "consumption_percentages"
+                submit_traced(executor, "total_pin", self.influxdb_repository.get_total_pin_value, device_ips,
+                              start_date, end_date, duration_str): "total_pin",
+                submit_traced(executor, "consumption_percentages", self.zone_data.grid_mix, self.get_zone(site_id),
+                              start_date, end_date): "consumption_percentages"
             }
 
             for future in as_completed(futures):
@@ -121,14 +133,13 @@ class PowerData:
                 try:
                     results[key] = future.result()
                 except Exception as e:
-                    print(f"Error in {key}: {e}")  # You can replace this with logging
+                    logger.error("Error in %s: %s", key, e)
 
         total_pin_value = results.get("total_pin", 0)  # Default to 0 if there's an error
         consumption_percentages = results.get("consumption_percentages", {})
-        logging.info(f"total_pin_value {total_pin_value}")
-        logging.info(f"consumption_percentages {consumption_percentages}")
+        logger.debug("total_pin_value %s, consumption_percentages %s", total_pin_value, consumption_percentages)
         if total_pin_value == 0 or not consumption_percentages:
-            print("Warning: Some values are missing due to errors.")
+            logger.warning("Some values are missing due to errors.")
 
         total_pin_value_KW = total_pin_value / 1000
 
@@ -141,212 +152,129 @@ class PowerData:
             "totalpin_kws": totalpin_kws
         }
 
-    def calculate_carbon_emission(self, site_id: int, duration_str: str) -> (float, float, str, str):
-
-        start_date, end_date = self.calculate_start_end_dates(duration_str)
-        device_ips=self.get_ips(site_id)
-
-        # total_pin_value = self.influxdb_repository.get_total_pin_value(device_ips, start_date, end_date, duration_str)
-        # carbon_intensity = self.influxdb_repository.get_carbon_intensity(start_date, end_date, duration_str)
-
-        results = {}
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = {
-                executor.submit(self.influxdb_repository.get_total_pin_value, device_ips, start_date, end_date,
-                                duration_str): "total_pin",
-                executor.submit(self.influxdb_repository.get_carbon_intensity, start_date, end_date,
-                                duration_str): "consumption_intensity"
-            }
-
-            for future in as_completed(futures):
-                key = futures[future]
-                try:
-                    results[key] = future.result()
-                except Exception as e:
-                    print(f"Error in {key}: {e}")  # You can replace this with logging
-        total_pin_value = results.get("total_pin", 0)  # Default to 0 if there's an error
-        carbon_intensity = results.get("consumption_intensity", 0)
+    def calculate_carbon_emission(self, site_id: int, duration_str: str) -> dict:
+        # Per-bucket energy x per-bucket grid intensity, rather than the range total x one intensity value
+        site = self.calculate_site_energy(site_id, duration_str)
+        carbon_emission_KG = site.co2_kg
+        logger.debug("Carbon emission: %s kg", carbon_emission_KG)
 
-        total_pin_value_KW = total_pin_value / 1000
-        carbon_emission = float(total_pin_value_KW) * float(carbon_intensity)
-        print("Emisssionsssssss", carbon_emission, file=sys.stderr)
-        carbon_emission_KG = round(carbon_emission / 1000, 2)
-        print("KGGGGGGGGGGGG", carbon_emission_KG, file=sys.stderr)
+        return {
+            "total_energy": Quantity(float(site.device_emissions["energy_kwh"].sum()), "kWh"),
+            "carbon_emission": Quantity(carbon_emission_KG, "kg"),
+            "carbon_effect_car": self.calculate_carbon_car(carbon_emission_KG),
+            "carbon_effect_flight": self.calculate_carbon_flight(carbon_emission_KG),
+            "carbon_solution": self.calculate_carbon_solution(carbon_emission_KG)
+        }
 
-        carbon_car = self.calculate_carbon_car(carbon_emission_KG)
-        carbon_flight = self.calculate_carbon_flight(carbon_emission_KG)
-        carbon_solution = self.calculate_carbon_solution(carbon_emission_KG)
+    def calculate_energy_consumption_by_id_with_filter(self, site_id: int, duration_str: str) -> pd.DataFrame:
+        return self.calculate_site_energy(site_id, duration_str).energy
 
-        if carbon_emission < 1000:
-            carbon_ems = str(round(carbon_emission, 3)) + ' kg'
-        else:
-            carbon_ems = str(round(carbon_emission / 1000, 3)) + ' Tons'
-
-        data={
-                "total_PIn": float(total_pin_value_KW),
-                "carbon_emission": carbon_ems,
-                "carbon_effect_car": carbon_car,
-                "carbon_effect_flight": carbon_flight,
-                "carbon_solution": carbon_solution
-            }
-        return data
-
-    def calculate_energy_consumption_by_id_with_filter(self, site_id: int, duration_str: str) -> List[
-        dict]:
+    def calculate_site_energy(self, site_id: Optional[int], duration_str: str,
+                              breakdown: Optional[str] = None) -> SiteEnergy:
+        """Site EER/PUE trend, the optional per-"device"/"rack" breakdown, per-device/per-rack CO2 and the
+        per-rack trends, all computed from one fetch of the per-device energy buckets.
 
+        With site_id None the same single fetch covers every site (a fleet report): each device's CO2 uses
+        its own site's grid zone, and a per-site summary is added.
+        """
+        if breakdown is not None and breakdown not in ENERGY_BREAKDOWNS:
+            raise ValueError(f"Unsupported energy breakdown: {breakdown}")
         start_date, end_date = self.calculate_start_end_dates(duration_str)
-        device_ips = self.get_ips(site_id)
+        device_sites = self.site_repository.get_device_sites(site_id)
+        device_ips = device_sites["ip"].unique().tolist()
         if not device_ips:
-            return []
+            return SiteEnergy(pd.DataFrame(columns=ENERGY_COLUMNS), None, pd.DataFrame(columns=EMISSION_COLUMNS),
+                              pd.Series(dtype=float))
+
+        zone_of_ip = self.zone_of_ip(device_sites)
+        zones = zone_of_ip.unique().tolist()
+        aggregate_window, _ = self.influxdb_repository.determine_aggregate_window(duration_str)
+        period = BUCKET_PERIODS[aggregate_window]
+        with ThreadPoolExecutor(max_workers=1 + len(zones)) as executor:
+            future_buckets = submit_traced(executor, "energy_buckets",
+                                           self.influxdb_repository.get_device_energy_buckets, device_ips,
+                                           start_date, end_date, duration_str)
+            future_intensities = {zone: submit_traced(executor, f"carbon_intensity.{zone}",
+                                                      self.zone_data.carbon_intensity, zone, start_date, end_date,
+                                                      period) for zone in zones}
+            buckets = future_buckets.result()
+            intensities = {zone: future.result() for zone, future in future_intensities.items()}
+        rack_ips = self.site_repository.get_rack_ips_by_site_id(site_id)
+
+        energy_metrics = site_energy(buckets)
+        logger.debug("Energy metrics:\n%s", energy_metrics)
+        energy_by_group = None
+        if breakdown == "device":
+            energy_by_group = energy_breakdown(buckets)
+        elif breakdown == "rack":
+            energy_by_group = energy_breakdown(buckets, rack_ips)
+
+        emissions = zoned_emissions(buckets, zone_of_ip, intensities, period, start_date, end_date)
+        sites = site_summary(buckets, emissions, device_sites) if site_id is None else None
+        return SiteEnergy(energy_metrics, energy_by_group, emissions, group_emissions(emissions, rack_ips, "rack_id"),
+                          sites, rack_series(buckets, rack_ips))
+
+    def calculate_previous_period(self, site_id: Optional[int],
+                                  duration_str: str) -> Tuple[PeriodSummary, Tuple[pd.Timestamp, pd.Timestamp]]:
+        """KPIs of the equivalent period before the report range, from cached buckets of that closed window."""
+        start_date, end_date = self.calculate_start_end_dates(duration_str)
+        aggregate_window, _ = self.influxdb_repository.determine_aggregate_window(duration_str)
+        period = BUCKET_PERIODS[aggregate_window]
+        window = previous_period(start_date, end_date, duration_str)
 
-        energy_metrics = self.influxdb_repository.get_energy_consumption_metrics_with_filter(device_ips, start_date,
-                                                                                             end_date,
-                                                                                             duration_str)
-        print("ENERGY_METRIC_OF_KPIIIIIIIIIII", energy_metrics, file=sys.stderr)
-        return energy_metrics
+        device_sites = self.site_repository.get_device_sites(site_id)
+        device_ips = device_sites["ip"].unique().tolist()
+        if not device_ips:
+            return period_summary(pd.DataFrame(columns=ENERGY_COLUMNS), pd.DataFrame(columns=EMISSION_COLUMNS)), window
+        zone_of_ip = self.zone_of_ip(device_sites)
+        buckets = self.bucket_rollups.buckets(site_id, device_ips, window[0], window[1], duration_str)
+        intensities = {zone: self.zone_data.carbon_intensity(zone, window[0].to_pydatetime(),
+                                                             window[1].to_pydatetime(), period)
+                       for zone in zone_of_ip.unique()}
+        emissions = zoned_emissions(buckets, zone_of_ip, intensities, period, window[0], window[1])
+        return period_summary(site_energy(buckets), emissions), window
 
     def get_device_inventory(self, site_id):
         with self.db_connection.session_scope() as session:
-            # Fetch all devices for the given site ID
-            devices = session.query(Device).filter(Device.site_id == site_id).all()
-
-            # Count distinct vendors for the given site ID
-            total_vendors = (
-                session.query(func.count(Device.vendor_id.distinct()))
-                .filter(Device.site_id == site_id)
-                .scalar()
+            # Counted in the database; site_id None counts the whole fleet
+            devices = session.query(
+                func.count(Device.id),
+                func.count(Device.vendor_id.distinct()),
+                func.coalesce(func.sum(case((Device.OnBoardingStatus.is_(True), 1), else_=0)), 0),
             )
-            # Fetch all racks for the given site ID
-            racks = session.query(Rack).filter(Rack.site_id == site_id).all()
-
-            # Calculate onboarded devices
-            onboarded_devices = sum(1 for device in devices if device.OnBoardingStatus)
+            racks = session.query(func.count(Rack.id))
+            if site_id is not None:
+                devices = devices.filter(Device.site_id == site_id)
+                racks = racks.filter(Rack.site_id == site_id)
+            total_devices, total_vendors, onboarded_devices = devices.one()
             return {
-                "onboarded_devices": onboarded_devices,
-                "total_devices": len(devices),
+                "onboarded_devices": int(onboarded_devices),
+                "total_devices": total_devices,
                 "total_vendors": total_vendors,
-                "total_racks": len(racks)
+                "total_racks": racks.scalar()
             }
 
-    def get_top_5_power_devices_with_filter(self, site_id: int, duration_str: str):
+    def get_device_metrics(self, site_id: int, duration_str: str) -> pd.DataFrame:
         start_date, end_date = self.calculate_start_end_dates(duration_str)
 
         device_inventory = self.site_repository.get_device_inventory_by_site_id(site_id)
         device_ips = [device['ip_address'] for device in device_inventory]
-        print("DEVIIIIIIIIIIIIIIIIIIIIIIIIIIIII", device_ips, file=sys.stderr)
-
-        top_devices_data_raw = self.influxdb_repository.get_top_5_devices(device_inventory, device_ips, start_date,
-                                                                          end_date, duration_str)
-        # top_devices_data = []
-        # processed_ips = set()
-        #
-        # for device_data in top_devices_data_raw:
-        #     ip = device_data['ip']
-        #     if ip in processed_ips:
-        #         continue
-        #
-        #     device_info = next((device for device in device_inventory if device['ip_address'] == ip), None)
-        #     if device_info:
-        #         cost_of_power = device_data['cost_of_power']
-        #         average_power = device_data['average_PIn']
-        #
-        #         top_devices_data.append(DevicePowerConsumption(
-        #             id=device_info['id'],
-        #             device_name=device_info['device_name'],
-        #             ip_address=device_info['ip_address'],
-        #             total_power=round(device_data['total_PIn'] / 1000, 2),
-        #             average_power=round(average_power, 2),
-        #             cost_of_power=round(cost_of_power, 2)
-        #         ))
-        #
-        #         processed_ips.add(ip)
-
-        return top_devices_data_raw
+        logger.debug("Device IPs: %s", device_ips)
 
-    def get_all_racks(self, site_id,duration):
-        with self.db_connection.session_scope()  as session:
-            start_date, end_date = self.calculate_start_end_dates(duration)
-            rack_list=[]
-            if site_id:
-                racks = session.query(Rack).filter(Rack.site_id == site_id).all()
-
-            else:
-                racks = session.query(Rack).all()
-            print("length",len(racks))
-
-            for rack in racks:
-
-                building = (
-                    session.query(Building.building_name)
-                    .join(rack_building_association, Building.id == rack_building_association.c.building_id)
-                    .filter(rack_building_association.c.rack_id == rack.id)
-                    .first()
-                )
-                rack.building_name = building[0] if building else None
-
-                apic_ips = session.query(Device.ip_address).filter(
-                    rack.id == DeviceInventory.rack_id, Device.id == DeviceInventory.apic_controller_id
-                ).distinct().all()
-
-                site_result = session.query(Site.site_name).filter(Site.id == rack.site_id).first()
-                rack.site_name = site_result[0] if site_result else None
-
-                num_devices = session.query(func.count(Device.id)).filter(Device.rack_id == rack.id).scalar()
-                rack.num_devices = num_devices
-                print("Num devices", rack.num_devices)
-
-                rack_power_data = self.influxdb_repository.get_24hrack_power(apic_ips, rack.id,start_date,
-                                                                          end_date, duration)
-                print(rack_power_data)
-
-                rack_traffic_data = self.influxdb_repository.get_24h_rack_datatraffic(apic_ips, rack.id,start_date,
-                                                                          end_date, duration)
-
-                if rack_power_data:
-                    power_utilization_values = [data.get('power_utilization', 0) for data in rack_power_data]
-                    total_power_utilization = sum(power_utilization_values)
-                    average_power_utilization = total_power_utilization / len(power_utilization_values)
-                    rack.power_utilization = round(average_power_utilization, 2)
-
-                    pue_values = [data.get('pue', 0) for data in rack_power_data]
-                    total_pue = sum(pue_values)
-                    average_pue = total_pue / len(pue_values)
-                    rack.pue = round(average_pue, 2)
-
-                    power_input_values = [data.get('power_input', 0) for data in rack_power_data]
-                    total_power_input = sum(power_input_values)
-                    rack.power_input = round(total_power_input / 1000, 2)
-
-                    power_output_values = [data.get('power_output', 0) for data in rack_power_data]
-                    total_power_output = sum(power_output_values)
-                    rack.power_output = round(total_power_output / 1000, 2)
-                else:
-                    rack.power_utilization = 0
-                    rack.pue = 0
-                    rack.power_input = 0
-                    rack.power_output = 0
-
-                if rack_traffic_data:
-                    traffic_throughput_values = [data.get('traffic_through', 0) for data in rack_traffic_data]
-                    total_traffic_throughput = sum(traffic_throughput_values)
-                    rack.datatraffic = round(total_traffic_throughput / (1024 ** 3), 2)
-                else:
-                    rack.datatraffic = 0
-
-                rack_list.append({
-
-                    "Rack Name": rack.rack_name,
-                    "Building": rack.building_name,
-                    "Site Name": rack.site_name,
-                    "Number of Devices": rack.num_devices,
-                    "EER": rack.power_utilization,
-                    "PUE": rack.pue,
-                    "Power Input (kW)": rack.power_input,
-                    "Power Output(kW)": rack.power_output,
-                    "Data Traffic (GB)": rack.datatraffic,
-                    "Co2":round((rack.power_input *0.471),4),
-                    "PCR":round((rack.power_input*1000)/rack.datatraffic,4) if rack.datatraffic > 0 else 0
-
-                })
-            return rack_list
+        return self.influxdb_repository.get_device_metrics(device_inventory, device_ips, start_date, end_date,
+                                                           duration_str)
 
+    def get_top_5_power_devices_with_filter(self, site_id: int, duration_str: str, metric: str = DEFAULT_RANK_METRIC,
+                                            k: int = 5) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        return rank_devices(self.get_device_metrics(site_id, duration_str), metric, k)
+
+    def get_all_racks(self, site_id,duration):
+        # One bulk read of the rack map and one grouped Influx query, however many racks (all of them for None)
+        start_date, end_date = self.calculate_start_end_dates(duration)
+        racks = self.site_repository.get_rack_details(site_id)
+        rack_ips = self.site_repository.get_rack_ips_by_site_id(site_id)
+        logger.debug("Racks: %d", len(racks))
+
+        totals = self.influxdb_repository.get_device_totals(rack_ips["ip"].unique().tolist(), start_date, end_date)
+        percentiles = self.influxdb_repository.get_rack_power_percentiles(rack_ips, start_date, end_date)
+        return rack_kpis(racks, rack_ips, totals, percentiles)
@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+# Units of each dimension, smallest first, with their size in the first unit
+UNIT_LADDERS = {
+    "power": [("W", 1.0), ("kW", 1e3), ("MW", 1e6)],
+    "energy": [("Wh", 1.0), ("kWh", 1e3), ("MWh", 1e6)],
+    "mass": [("kg", 1.0), ("tons", 1e3)],
+    "rate": [("Mbps", 1.0), ("Gbps", 1e3)],
+    "data": [("GB", 1.0), ("TB", 1e3)],
+}
+# unit -> (dimension, size in the dimension's first unit)
+UNITS = {unit: (dimension, size) for dimension, ladder in UNIT_LADDERS.items() for unit, size in ladder}
+
+
+@dataclass(frozen=True)
+class Quantity:
+    """A number, or an array of numbers, together with its unit.
+
+    The data layer hands out raw floats and Quantities; choosing a display unit and turning the
+    value into text is left to the renderer (report.units).
+    """
+    value: Any
+    unit: str
+
+    def __post_init__(self):
+        if self.unit not in UNITS:
+            raise ValueError(f"Unsupported unit: {self.unit}")
+
+    @property
+    def dimension(self) -> str:
+        return UNITS[self.unit][0]
+
+    def to(self, unit: str) -> "Quantity":
+        dimension, size = UNITS[unit]
+        if dimension != self.dimension:
+            raise ValueError(f"Cannot convert {self.unit} to {unit}")
+        return Quantity(np.asarray(self.value, dtype=float) * (UNITS[self.unit][1] / size), unit)
@@ -0,0 +1,55 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# Rankable metric -> raw numeric column of the device metrics frame
+RANK_METRICS = {
+    "power": "total_power",
+    "traffic": "traffic_speed",
+    "utilization": "bandwidth_utilization",
+    "pcr": "pcr",
+    "co2": "co2emmissions",
+}
+DEFAULT_RANK_METRIC = "power"
+
+
+def top_k_indices(values, k: int, largest: bool = True) -> np.ndarray:
+    """Positions of the k largest (or smallest) values, best first; NaNs are never ranked.
+
+    argpartition finds the k candidates in O(n) and only those k are sorted.
+    """
+    values = np.asarray(values, dtype=float)
+    candidates = np.flatnonzero(~np.isnan(values))
+    k = min(k, len(candidates))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    keys = -values[candidates] if largest else values[candidates]
+    selected = np.argpartition(keys, k - 1)[:k]
+    return candidates[selected[np.argsort(keys[selected], kind="stable")]]
+
+
+def rank_devices(devices: pd.DataFrame, metric: str = DEFAULT_RANK_METRIC,
+                 k: int = 5) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Top and bottom k devices by metric, both listed highest first.
+
+    The bottom list only takes devices not already in the top list.
+    """
+    if metric not in RANK_METRICS:
+        raise ValueError(f"Unsupported ranking metric: {metric}")
+    values = devices[RANK_METRICS[metric]].to_numpy(dtype=float)
+    top = top_k_indices(values, k)
+    remaining = values.copy()
+    remaining[top] = np.nan
+    bottom = top_k_indices(remaining, k, largest=False)
+    return devices.iloc[top].reset_index(drop=True), devices.iloc[bottom[::-1]].reset_index(drop=True)
+
+
+def top_device_by_group(devices: pd.DataFrame, key: str, metric: str = DEFAULT_RANK_METRIC) -> pd.Series:
+    """device_name of the highest-ranked device in each group (e.g. site_id), indexed by the group."""
+    if metric not in RANK_METRICS:
+        raise ValueError(f"Unsupported ranking metric: {metric}")
+    column = RANK_METRICS[metric]
+    ranked = devices[[key, "device_name", column]].dropna(subset=[key, column])
+    best = ranked.sort_values(column, ascending=False, kind="stable").drop_duplicates(key)
+    return best.set_index(key)["device_name"]
@@ -0,0 +1,37 @@
+import re
+from typing import Dict, List, Optional
+
+# Every word of Reports.report_type that sets a report option, mapped to (option, value). A word means the
+# same thing wherever it appears, e.g. "Energy Report (rack, compare, screen)", and nothing else is reserved.
+REPORT_TYPE_WORDS = {
+    "pdf": ("format", "pdf"),
+    "json": ("format", "json"),
+    "csv": ("format", "csv"),
+    "parquet": ("format", "parquet"),
+    "html": ("format", "html"),
+    "draft": ("profile", "draft"),
+    "quick": ("profile", "draft"),
+    "screen": ("profile", "screen"),
+    "preview": ("profile", "screen"),
+    "web": ("profile", "screen"),
+    "print": ("profile", "print"),
+    "device": ("breakdown", "device"),
+    "rack": ("breakdown", "rack"),
+    "compare": ("comparison", "compare"),
+    "comparison": ("comparison", "compare"),
+}
+
+
+def report_type_words(report_type: Optional[str]) -> List[str]:
+    """Lower-case words of a report type, in order."""
+    return [word for word in re.split(r"[^a-z]+", (report_type or "").lower()) if word]
+
+
+def report_type_options(report_type: Optional[str]) -> Dict[str, str]:
+    """Options set by a report type, {option: value}; the first word naming an option wins."""
+    options = {}
+    for word in report_type_words(report_type):
+        if word in REPORT_TYPE_WORDS:
+            option, value = REPORT_TYPE_WORDS[word]
+            options.setdefault(option, value)
+    return options
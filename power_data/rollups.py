@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import pandas as pd
+
+from metrics.metrics import record_cache_lookup
+from power_data.aggregation import BUCKET_COLUMNS
+from repo.influxdb_repository import BUCKET_PERIODS, InfluxdbRepository
+
+
+class _RollupCache:
+    def __init__(self, device_ips: FrozenSet[str]):
+        self.lock = threading.Lock()
+        self.device_ips = device_ips
+        self.buckets = None
+        # Closed buckets [start, end) already fetched
+        self.start = None
+        self.end = None
+
+
+class BucketRollupService:
+    """Per-device energy buckets of closed windows, kept per site and duration for the life of the daemon.
+
+    A closed window never changes, so a report comparing against its previous period only
+    queries the buckets no earlier report of the same site and duration has already fetched.
+    A duration's window only moves forward, so buckets before the last requested window are
+    dropped, and a site whose devices changed starts over.
+    """
+
+    def __init__(self, influxdb_repository=None):
+        self.influxdb_repository = influxdb_repository or InfluxdbRepository()
+        self._caches: Dict[Tuple[str, Optional[int]], _RollupCache] = {}
+        self._caches_lock = threading.Lock()
+
+    def _cache(self, duration_str: str, site_id: Optional[int], device_ips: List[str]) -> _RollupCache:
+        device_ips = frozenset(device_ips)
+        with self._caches_lock:
+            cache = self._caches.get((duration_str, site_id))
+            if cache is None or cache.device_ips != device_ips:
+                cache = self._caches[(duration_str, site_id)] = _RollupCache(device_ips)
+            return cache
+
+    def buckets(self, site_id: Optional[int], device_ips: List[str], start: datetime, end: datetime,
+                duration_str: str) -> pd.DataFrame:
+        """Every whole bucket overlapping the closed window [start, end).
+
+        The edge buckets are kept whole so they can be cached; weight them by their overlap with the window.
+        """
+        window, _ = self.influxdb_repository.determine_aggregate_window(duration_str)
+        period = BUCKET_PERIODS[window]
+        start = pd.Timestamp(start).to_period(period).start_time
+        end = ((pd.Timestamp(end) - pd.Timedelta(1)).to_period(period) + 1).start_time
+        cache = self._cache(duration_str, site_id, device_ips)
+        with cache.lock:
+            if cache.start is None:
+                missing = [(start, end)]
+            else:
+                missing = [(start, cache.start)] if start < cache.start else []
+                if end > cache.end:
+                    missing.append((cache.end, end))
+            record_cache_lookup("bucket_rollups", hit=not missing)
+
+            for fetch_start, fetch_end in missing:
+                fetched = self.influxdb_repository.get_device_energy_buckets(
+                    device_ips, fetch_start.to_pydatetime(), fetch_end.to_pydatetime(), duration_str)
+                # The range grid also labels the bucket starting at fetch_end, which belongs to the next fetch
+                fetched = fetched[(fetched["time"] >= fetch_start) & (fetched["time"] < fetch_end)]
+                buckets = fetched if cache.buckets is None else pd.concat([cache.buckets, fetched])
+                cache.buckets = buckets.drop_duplicates(["ip", "time"], keep="last").sort_values(["ip", "time"])
+            if missing:
+                cache.start = start if cache.start is None else min(start, cache.start)
+                cache.end = end if cache.end is None else max(cache.end, end)
+
+            buckets = cache.buckets
+            selected = buckets[(buckets["time"] >= start) & (buckets["time"] < end)]
+            cache.buckets = buckets[buckets["time"] >= start]
+            cache.start = start
+            return selected.reindex(columns=BUCKET_COLUMNS).reset_index(drop=True)
+
+
+_SERVICE: Optional[BucketRollupService] = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_bucket_rollup_service() -> BucketRollupService:
+    """Process-wide service, so every report in the daemon shares one cache."""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = BucketRollupService()
+        return _SERVICE
@@ -0,0 +1,92 @@
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+
+from metrics.metrics import record_cache_lookup
+from repo.influxdb_repository import GRID_SOURCES, InfluxdbRepository
+
+DEFAULT_ZONE = "AE"
+
+
+class _ZoneCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hours = None
+        # Settled hours [start, end) are never fetched again
+        self.start = None
+        self.end = None
+
+
+class ZoneDataService:
+    """Hourly grid mix and carbon intensity per zone, fetched once and shared by every site's report.
+
+    A request only queries the hours outside what is already cached. Hours newer than
+    ZONE_DATA_SETTLE_HOURS may still be revised upstream, so they are re-read until they settle.
+    """
+
+    def __init__(self, influxdb_repository=None, settle_hours=None):
+        self.influxdb_repository = influxdb_repository or InfluxdbRepository()
+        self.settle_hours = int(os.getenv("ZONE_DATA_SETTLE_HOURS", 2)) if settle_hours is None else settle_hours
+        self._zones: Dict[str, _ZoneCache] = {}
+        self._zones_lock = threading.Lock()
+
+    def _cache(self, zone: str) -> _ZoneCache:
+        with self._zones_lock:
+            return self._zones.setdefault(zone, _ZoneCache())
+
+    def hourly(self, zone: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """Cached hourly rows for the zone with start <= hour < end."""
+        start = pd.Timestamp(start).floor("h")
+        end = pd.Timestamp(end)
+        cache = self._cache(zone)
+        with cache.lock:
+            if cache.start is None:
+                missing = [(start, end)]
+            else:
+                missing = [(start, cache.start)] if start < cache.start else []
+                if end > cache.end:
+                    missing.append((cache.end, end))
+            record_cache_lookup("zone_data", hit=not missing)
+
+            for fetch_start, fetch_end in missing:
+                fetched = self.influxdb_repository.get_zone_hourly(zone, fetch_start.to_pydatetime(),
+                                                                   fetch_end.to_pydatetime())
+                hours = fetched if cache.hours is None else pd.concat([cache.hours, fetched])
+                cache.hours = hours[~hours.index.duplicated(keep="last")].sort_index()
+            if missing:
+                settled = pd.Timestamp.now(tz="UTC").tz_localize(None).floor("h") - pd.Timedelta(hours=self.settle_hours)
+                settled_end = max(start, min(end, settled))
+                cache.start = start if cache.start is None else min(start, cache.start)
+                cache.end = settled_end if cache.end is None else max(cache.end, settled_end)
+
+            hours = cache.hours
+            return hours[(hours.index >= start) & (hours.index < end)].copy()
+
+    def grid_mix(self, zone: str, start: datetime, end: datetime) -> Dict[str, int]:
+        """Whole-percent share of each source in the zone's consumption over the range."""
+        totals = self.hourly(zone, start, end)[GRID_SOURCES].sum()
+        overall = totals.sum()
+        return {source: math.floor(value / overall * 100) if overall > 0 else 0 for source, value in totals.items()}
+
+    def carbon_intensity(self, zone: str, start: datetime, end: datetime, period: str) -> pd.DataFrame:
+        """Mean carbon intensity (gCO2eq/kWh) per report bucket of the given pandas period."""
+        intensity = self.hourly(zone, start, end)["carbon_intensity"].dropna()
+        buckets = intensity.groupby(intensity.index.to_period(period).start_time).mean()
+        return pd.DataFrame({"time": buckets.index, "carbon_intensity": buckets.to_numpy(dtype=float)})
+
+
+_SERVICE: Optional[ZoneDataService] = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_zone_data_service() -> ZoneDataService:
+    """Process-wide service, so every report in the daemon shares one cache."""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = ZoneDataService()
+        return _SERVICE
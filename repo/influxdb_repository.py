@@ -1,5 +1,5 @@
-import math
-import sys
+import json
+import logging
 from typing import List
 from datetime import datetime
 
@@ -7,17 +7,49 @@ import numpy as np
 import pandas as pd
 from influxdb_client import InfluxDBClient
 from Database.db_connector import DBConnection
+from metrics.metrics import record_influx_query, timed_stage
+from metrics.tracing import query_hash, span
+from power_data.aggregation import BUCKET_COLUMNS, DEVICE_TOTAL_COLUMNS, POWER_PERCENTILES, site_energy
  # Ensure configs.py contains INFLUXDB_BUCKET
 
+logger = logging.getLogger(__name__)
+
+# electricityMap sources reported as <source>_consumption fields of electricitymap_power
+GRID_SOURCES = ["nuclear", "geothermal", "biomass", "coal", "wind", "solar", "hydro", "gas", "oil", "unknown",
+                "battery_discharge"]
+
+# Flux window -> pandas period used to label every bucket in the requested range
+BUCKET_PERIODS = {"1h": "h", "1d": "D", "1mo": "M"}
+# Fixed window of the rack power samples whose percentiles are reported, whatever the report buckets
+RACK_POWER_WINDOW = "15m"
+
 
 class InfluxdbRepository:
-    def __init__(self):
-        """Initialize the InfluxDB connection using DBConnection."""
-        self.db_connection = DBConnection()
+    def __init__(self, db_connection=None):
+        """Initialize the InfluxDB connection using DBConnection (a new one unless given)."""
+        self.db_connection = db_connection or DBConnection()
         self.query_api = self.db_connection.query_api  # Ensure this is set in DBConnection
         self.bucket="Dcs_db"
         # self.query_api1 = self.client.query_api()
 
+    def _query_data_frame(self, query: str, method: str):
+        with span("flux", method=method, query_hash=query_hash(query)) as current:
+            result = self.query_api.query_data_frame(query)
+            frames = result if isinstance(result, list) else [result]
+            rows = sum(len(frame) for frame in frames)
+            if current:
+                current.set(rows=rows, bytes=int(sum(frame.memory_usage().sum() for frame in frames)))
+        record_influx_query(method, rows)
+        return result
+
+    def _query_frame(self, query: str, method: str) -> pd.DataFrame:
+        """_query_data_frame flattened to one frame (the client returns a list when table schemas differ)."""
+        result = self._query_data_frame(query, method)
+        if isinstance(result, list):
+            return pd.concat(result, ignore_index=True) if result else pd.DataFrame()
+        return result
+
+    @timed_stage("influx.get_total_pin_value")
     def get_total_pin_value(self, device_ips: List[str], start_date: datetime, end_date: datetime,
                             duration_str: str) -> float:
         start_time = start_date.isoformat() + 'Z'
@@ -33,431 +65,278 @@ class InfluxdbRepository:
                 |> filter(fn: (r) => r["_field"] == "total_PIn")
                 |> aggregateWindow(every: {aggregate_window}, fn: sum, createEmpty: false)
             '''
-            result = self.query_api.query_data_frame(query)
+            result = self._query_data_frame(query, "get_total_pin_value")
             if not result.empty:
                 total_pin += result['_value'].sum()
 
         return total_pin
 
-    def get_consumption_percentages(self, start_date: datetime, end_date: datetime, duration_str: str) -> dict:
+    @timed_stage("influx.get_zone_hourly")
+    def get_zone_hourly(self, zone: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """Hourly grid mix (per-source consumption) and carbon intensity for one electricityMap zone.
+
+        Indexed by the UTC start of each hour; one query covers both measurements.
+        """
+        query = f'''
+            from(bucket: "{self.bucket}")
+            |> range(start: {start.isoformat()}Z, stop: {end.isoformat()}Z)
+            |> filter(fn: (r) => r["zone"] == "{zone}")
+            |> filter(fn: (r) =>
+                (r["_measurement"] == "electricitymap_power" and r["_field"] =~ /_consumption$/) or
+                (r["_measurement"] == "electricitymap_carbonIntensity" and r["_field"] == "carbonIntensity"))
+            |> aggregateWindow(every: 1h, fn: mean, createEmpty: false, timeSrc: "_start")
+            |> keep(columns: ["_time", "_field", "_value"])
+            |> group()
+            |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+        '''
+        result = self._query_frame(query, "get_zone_hourly")
+        columns = ["carbon_intensity"] + GRID_SOURCES
+        if result.empty:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name="time"))
+        result = result.rename(columns={"carbonIntensity": "carbon_intensity",
+                                        **{f"{source}_consumption": source for source in GRID_SOURCES}})
+        result.index = pd.DatetimeIndex(pd.to_datetime(result["_time"], utc=True).dt.tz_convert(None), name="time")
+        return result.reindex(columns=columns).astype(float)
+
+    @timed_stage("influx.get_device_energy_buckets")
+    def get_device_energy_buckets(self, device_ips: List[str], start_date: datetime, end_date: datetime,
+                                  duration_str: str) -> pd.DataFrame:
+        """Mean total_PIn/total_POut and traffic byte rate per device per report bucket, fetched with one
+        query for all devices.
+
+        Every device that reported anything gets a row for every bucket in the range (0 where it was silent).
+        """
         start_time = start_date.isoformat() + 'Z'
         end_time = end_date.isoformat() + 'Z'
-        aggregate_window = "1h" if duration_str == "24 hours" else "1d"
-        zone = "AE"
+        aggregate_window, _ = self.determine_aggregate_window(duration_str)
+        period = BUCKET_PERIODS[aggregate_window]
 
         query = f'''
             from(bucket: "{self.bucket}")
             |> range(start: {start_time}, stop: {end_time})
-            |> filter(fn: (r) => r["_measurement"] == "electricitymap_power" and r["zone"] == "{zone}")
-            |> filter(fn: (r) => 
-                r["_field"] == "nuclear_consumption" or 
-                r["_field"] == "geothermal_consumption" or 
-                r["_field"] == "biomass_consumption" or 
-                r["_field"] == "coal_consumption" or 
-                r["_field"] == "wind_consumption" or 
-                r["_field"] == "solar_consumption" or 
-                r["_field"] == "hydro_consumption" or 
-                r["_field"] == "gas_consumption" or 
-                r["_field"] == "oil_consumption" or 
-                r["_field"] == "unknown_consumption" or 
-                r["_field"] == "battery_discharge_consumption")
-            |> aggregateWindow(every: {aggregate_window}, fn: sum, createEmpty: false)
+            |> filter(fn: (r) => contains(value: r["ApicController_IP"], set: {json.dumps(list(device_ips))}))
+            |> filter(fn: (r) =>
+                (r["_measurement"] == "DevicePSU" and (r["_field"] == "total_PIn" or r["_field"] == "total_POut")) or
+                (r["_measurement"] == "DeviceEngreeTraffic" and r["_field"] == "total_bytesRateLast"))
+            |> aggregateWindow(every: {aggregate_window}, fn: mean, createEmpty: true, timeSrc: "_start")
             |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+            |> keep(columns: ["_time", "ApicController_IP", "total_PIn", "total_POut", "total_bytesRateLast"])
         '''
-        result = self.query_api.query_data_frame(query)
-        print("RESULT", result, file=sys.stderr)
-
-        # Initialize the consumption totals dictionary with specific fields.
-        consumption_totals = {
-            "nuclear": 0, "geothermal": 0, "biomass": 0, "coal": 0, "wind": 0,
-            "solar": 0, "hydro": 0, "gas": 0, "oil": 0, "unknown": 0, "battery_discharge": 0
-        }
-
-        if not result.empty:
-            # Extract the sums from the query result for each field.
-            for field in consumption_totals.keys():
-                field_name = f"{field}_consumption"
-                if field_name in result.columns:
-                    consumption_totals[field] = result[field_name].sum()
-
-        # Calculate the total power consumption from the retrieved data.
-        powerConsumptionTotal = sum(consumption_totals.values())
-
-        # Compute the percentage of total power consumption for each field.
-        percentages = {field: math.floor((value / powerConsumptionTotal) * 100) if powerConsumptionTotal > 0 else 0
-                       for field, value in consumption_totals.items()}
-
-        return percentages
-    def get_carbon_intensity(self, start_date: datetime, end_date: datetime, duration_str: str) -> float:
-        start_time = start_date.isoformat() + 'Z'
-        end_time = end_date.isoformat() + 'Z'
-        # Determine the appropriate aggregate window based on the duration
-        if duration_str == "24 hours":
-            aggregate_window = "1h"
-            aggregation_function = "max()"  # For 24 hours, take the maximum value
-        elif duration_str in ["7 Days", "Current Month", "Last Month"]:
-            aggregate_window = "1d"
-            aggregation_function = "sum()"  # Sum for longer durations
-        else:
-            aggregate_window = "1m"
-            aggregation_function = "sum()"
+        result = self._query_frame(query, "get_device_energy_buckets")
+        if result.empty:
+            return pd.DataFrame(columns=BUCKET_COLUMNS)
 
-        zone = "AE"
+        values = BUCKET_COLUMNS[2:]
+        result = result.reindex(columns=["_time", "ApicController_IP"] + values)
+        result["time"] = pd.to_datetime(result["_time"], utc=True).dt.tz_convert(None).dt.to_period(period).dt.start_time
+        result = result.rename(columns={"ApicController_IP": "ip"})
+        # A device can report several PSU series; its bucket value is their mean, as before
+        device_buckets = result.groupby(["ip", "time"])[values].mean()
 
-        # InfluxDB query to fetch the carbon intensity
-        query = f'''
-                from(bucket: "{self.bucket}")
-                |> range(start: {start_time}, stop: {end_time})
-                |> filter(fn: (r) => r["_measurement"] == "electricitymap_carbonIntensity" and r["zone"] == "{zone}")
-                |> filter(fn: (r) => r["_field"] == "carbonIntensity")
-                |> aggregateWindow(every: {aggregate_window}, fn: max, createEmpty: false)
-                |> {aggregation_function}  
-            '''
-        result = self.query_api.query_data_frame(query)
-        print("RESULT", result, file=sys.stderr)
-        carbon_intensity = result['_value'] if not result.empty else 0
-        print("carbon_intensity", carbon_intensity, file=sys.stderr)
+        all_times = pd.period_range(start=start_date, end=end_date, freq=period).start_time
+        grid = pd.MultiIndex.from_product([device_buckets.index.unique("ip"), all_times], names=["ip", "time"])
+        return device_buckets.reindex(grid, fill_value=0).fillna(0).reset_index()
 
-        return carbon_intensity
     def get_energy_consumption_metrics_with_filter(self, device_ips: List[str], start_date: datetime,
-                                                   end_date: datetime, duration_str: str) -> List[dict]:
-        total_power_metrics = []
-        start_time = start_date.isoformat() + 'Z'
-        end_time = end_date.isoformat() + 'Z'
+                                                   end_date: datetime, duration_str: str) -> pd.DataFrame:
+        return site_energy(self.get_device_energy_buckets(device_ips, start_date, end_date, duration_str))
 
-        # Define the aggregate window and time format based on the duration string
-        if duration_str in ["24 hours"]:
-            aggregate_window = "1h"
-            time_format = '%Y-%m-%d %H:00'
-        elif duration_str in ["7 Days", "Current Month", "Last Month"]:
-            aggregate_window = "1d"
-            time_format = '%Y-%m-%d'
-        else:  # For "last 6 months", "last year", "current year",
-            aggregate_window = "1m"
-            time_format = '%Y-%m'
-
-        for ip in device_ips:
-            query = f'''
-                from(bucket: "{self.bucket}")
-                |> range(start: {start_time}, stop: {end_time})
-                |> filter(fn: (r) => r["_measurement"] == "DevicePSU" and r["ApicController_IP"] == "{ip}")
-                |> filter(fn: (r) => r["_field"] == "total_PIn" or r["_field"] == "total_POut")
-                |> aggregateWindow(every: {aggregate_window}, fn: mean, createEmpty: true)
-                |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-            '''
-            result = self.query_api.query_data_frame(query)
-
-            if not result.empty:
-                result['_time'] = pd.to_datetime(result['_time']).dt.strftime(time_format)
-                numeric_cols = result.select_dtypes(include=[np.number]).columns.tolist()
-                if '_time' in result.columns and numeric_cols:
-                    grouped = result.groupby('_time')[numeric_cols].mean().reset_index()
-                    grouped['_time'] = pd.to_datetime(grouped['_time'])
-                    grouped.set_index('_time', inplace=True)
-
-                    all_times = pd.date_range(start=start_date, end=end_date, freq=aggregate_window.upper()).strftime(
-                        time_format)
-                    grouped = grouped.reindex(all_times).fillna(0).reset_index()
-
-                    for _, row in grouped.iterrows():
-                        pin = row['total_PIn']
-                        pout = row['total_POut']
-
-                        energy_consumption = pout / pin if pin > 0 else 0
-                        power_efficiency = ((pin / pout) ) if pout > 0 else 0
-
-                        total_power_metrics.append({
-                            "time": row['index'],
-                            "energy_efficiency": round(energy_consumption, 2),
-                            "total_POut": round(pout, 2),
-                            "total_PIn": round(pin, 2),
-                            "power_efficiency": round(power_efficiency, 2)
-                        })
-
-        df = pd.DataFrame(total_power_metrics).drop_duplicates(subset='time').to_dict(orient='records')
-        return df
     def determine_aggregate_window(self, duration_str: str) -> tuple:
         if duration_str == "24 hours":
             return "1h", '%Y-%m-%d %H:00'
         elif duration_str in ["7 Days", "Current Month", "Last Month"]:
             return "1d", '%Y-%m-%d'
         else:  # For "last 6 months", "last year", "current year"
-            return "1m", '%Y-%m'
+            return "1mo", '%Y-%m'  # Flux "1m" would be one minute
 
-    def fetch_device_power_consumption(self, ip, start_time, end_time, aggregate_window):
-        query = f'''
-               from(bucket: "{self.bucket}")
-                 |> range(start: {start_time}, stop: {end_time})
-                 |> filter(fn: (r) => r["ApicController_IP"] == "{ip}")
-                 |> filter(fn: (r) => r["_measurement"] == "DevicePSU" and r["_field"] == "total_PIn")
-                 |> aggregateWindow(every: {aggregate_window}, fn: sum, createEmpty: false)
-           '''
+    @timed_stage("influx.get_device_totals")
+    def get_device_totals(self, device_ips: List[str], start_date: datetime, end_date: datetime) -> pd.DataFrame:
+        """Range sums of total_PIn, total_POut and total_bytesRateLast per device IP, in one query for all IPs.
 
+        Indexed by ip, one row per requested IP (0 where a device reported nothing).
+        """
+        if not device_ips:
+            return pd.DataFrame(columns=DEVICE_TOTAL_COLUMNS, index=pd.Index([], name="ip"), dtype=float)
+        query = f'''
+            from(bucket: "{self.bucket}")
+            |> range(start: {start_date.isoformat()}Z, stop: {end_date.isoformat()}Z)
+            |> filter(fn: (r) => contains(value: r["ApicController_IP"], set: {json.dumps(list(device_ips))}))
+            |> filter(fn: (r) =>
+                (r["_measurement"] == "DevicePSU" and (r["_field"] == "total_PIn" or r["_field"] == "total_POut")) or
+                (r["_measurement"] == "DeviceEngreeTraffic" and r["_field"] == "total_bytesRateLast"))
+            |> group(columns: ["ApicController_IP", "_field"])
+            |> sum()
+            |> group()
+            |> pivot(rowKey: ["ApicController_IP"], columnKey: ["_field"], valueColumn: "_value")
+        '''
+        result = self._query_frame(query, "get_device_totals")
+        totals = pd.DataFrame(columns=DEVICE_TOTAL_COLUMNS, dtype=float) if result.empty else \
+            result.set_index("ApicController_IP").reindex(columns=DEVICE_TOTAL_COLUMNS).astype(float)
+        return totals.reindex(pd.Index(pd.unique(np.asarray(device_ips)), name="ip")).fillna(0)
+
+    @timed_stage("influx.get_device_power_percentiles")
+    def get_device_power_percentiles(self, device_ips: List[str], start_date: datetime,
+                                     end_date: datetime) -> pd.DataFrame:
+        """p50/p95/p99 (t-digest estimates) and max of total_PIn per device IP over the range, in W.
+
+        Computed by InfluxDB in one query for all IPs, so only four numbers per device come back
+        however long the range is. Indexed by ip, NaN where a device reported nothing.
+        """
+        columns = [f"power_{name}" for name in POWER_PERCENTILES] + ["power_max"]
+        index = pd.Index(pd.unique(np.asarray(device_ips)), name="ip")
+        if not device_ips:
+            return pd.DataFrame(columns=columns, index=index, dtype=float)
+        stats = "\n            ".join(
+            f'{name} = samples |> quantile(q: {q}, method: "estimate_tdigest") |> set(key: "stat", value: "power_{name}")'
+            for name, q in POWER_PERCENTILES.items())
+        query = f'''
+            samples = from(bucket: "{self.bucket}")
+                |> range(start: {start_date.isoformat()}Z, stop: {end_date.isoformat()}Z)
+                |> filter(fn: (r) => r["_measurement"] == "DevicePSU" and r["_field"] == "total_PIn")
+                |> filter(fn: (r) => contains(value: r["ApicController_IP"], set: {json.dumps(list(device_ips))}))
+                |> group(columns: ["ApicController_IP"])
+            {stats}
+            peak = samples |> max() |> set(key: "stat", value: "power_max")
+            union(tables: [{", ".join(POWER_PERCENTILES)}, peak])
+                |> keep(columns: ["ApicController_IP", "stat", "_value"])
+                |> group()
+                |> pivot(rowKey: ["ApicController_IP"], columnKey: ["stat"], valueColumn: "_value")
+        '''
+        result = self._query_frame(query, "get_device_power_percentiles")
+        if result.empty:
+            return pd.DataFrame(columns=columns, index=index, dtype=float)
+        return result.set_index("ApicController_IP").reindex(index=index, columns=columns).astype(float)
+
+    @timed_stage("influx.get_rack_power_percentiles")
+    def get_rack_power_percentiles(self, rack_ips: pd.DataFrame, start_date: datetime,
+                                   end_date: datetime) -> pd.DataFrame:
+        """p50/p95/p99 (t-digest estimates) and max of each rack's total_PIn over RACK_POWER_WINDOW samples, in W.
+
+        InfluxDB averages every device per window, joins the windows to the rack_ips map ("ip", "rack_id";
+        a device feeding several racks counts toward each), sums each rack per window and takes the
+        percentiles, so only four numbers per rack come back. Windows where a device reported nothing
+        are left out rather than counted as 0. Indexed by rack_id, NaN where a rack reported nothing.
+        """
+        columns = [f"power_{name}" for name in POWER_PERCENTILES] + ["power_max"]
+        pairs = rack_ips[["ip", "rack_id"]].dropna().drop_duplicates()
+        index = pd.Index(pd.unique(pairs["rack_id"].to_numpy()), name="rack_id")
+        if pairs.empty:
+            return pd.DataFrame(columns=columns, index=index, dtype=float)
+        rows = ", ".join(f'{{ApicController_IP: {json.dumps(ip)}, rack_id: {int(rack_id)}}}'
+                         for ip, rack_id in pairs.itertuples(index=False))
+        stats = "\n            ".join(
+            f'{name} = rack_power |> quantile(q: {q}, method: "estimate_tdigest") |> set(key: "stat", value: "power_{name}")'
+            for name, q in POWER_PERCENTILES.items())
+        query = f'''
+            import "array"
+            import "join"
+
+            racks = array.from(rows: [{rows}])
+            windows = from(bucket: "{self.bucket}")
+                |> range(start: {start_date.isoformat()}Z, stop: {end_date.isoformat()}Z)
+                |> filter(fn: (r) => r["_measurement"] == "DevicePSU" and r["_field"] == "total_PIn")
+                |> filter(fn: (r) => contains(value: r["ApicController_IP"], set: {json.dumps(pairs["ip"].unique().tolist())}))
+                |> aggregateWindow(every: {RACK_POWER_WINDOW}, fn: mean, createEmpty: false, timeSrc: "_start")
+                |> group(columns: ["ApicController_IP", "_time"])
+                |> mean()
+                |> group()
+            rack_power = join.inner(left: windows, right: racks,
+                                    on: (l, r) => l.ApicController_IP == r.ApicController_IP,
+                                    as: (l, r) => ({{l with rack_id: r.rack_id}}))
+                |> group(columns: ["rack_id", "_time"])
+                |> sum()
+                |> group(columns: ["rack_id"])
+            {stats}
+            peak = rack_power |> max() |> set(key: "stat", value: "power_max")
+            union(tables: [{", ".join(POWER_PERCENTILES)}, peak])
+                |> keep(columns: ["rack_id", "stat", "_value"])
+                |> group()
+                |> pivot(rowKey: ["rack_id"], columnKey: ["stat"], valueColumn: "_value")
+        '''
+        result = self._query_frame(query, "get_rack_power_percentiles")
+        if result.empty:
+            return pd.DataFrame(columns=columns, index=index, dtype=float)
+        return result.set_index("rack_id").reindex(index=index, columns=columns).astype(float)
+
+    @timed_stage("influx.get_device_traffic")
+    def get_device_traffic(self, device_ips: List[str], start_date: datetime, end_date: datetime,
+                           aggregate_window: str) -> pd.DataFrame:
+        """Bandwidth and traffic speed (Mbps) and utilization (%) per device IP, in one query for all IPs.
+
+        Each is the mean of the windowed means, as per-device queries used to compute it.
+        """
+        columns = ["total_bandwidth", "traffic_speed", "bandwidth_utilization"]
+        index = pd.Index(pd.unique(np.asarray(device_ips)), name="ip")
+        if not device_ips:
+            return pd.DataFrame(columns=columns, index=index, dtype=float)
+        query = f'''
+            from(bucket: "{self.bucket}")
+            |> range(start: {start_date.isoformat()}Z, stop: {end_date.isoformat()}Z)
+            |> filter(fn: (r) => r["_measurement"] == "DeviceEngreeTraffic")
+            |> filter(fn: (r) => contains(value: r["ApicController_IP"], set: {json.dumps(list(device_ips))}))
+            |> filter(fn: (r) => r["_field"] == "bandwidth" or r["_field"] == "total_bytesRateLast")
+            |> aggregateWindow(every: {aggregate_window}, fn: mean, createEmpty: false)
+            |> group(columns: ["ApicController_IP", "_field"])
+            |> mean()
+            |> group()
+            |> pivot(rowKey: ["ApicController_IP"], columnKey: ["_field"], valueColumn: "_value")
+        '''
+        result = self._query_frame(query, "get_device_traffic")
+        if result.empty:
+            return pd.DataFrame(0.0, columns=columns, index=index)
+
+        result = result.set_index("ApicController_IP").reindex(index=index, columns=["bandwidth", "total_bytesRateLast"])
+        result = result.astype(float).fillna(0)
+        bandwidth = result["bandwidth"].to_numpy() / 1000  # Convert Kbps to Mbps
+        traffic_speed = result["total_bytesRateLast"].to_numpy() * 8 / 1e6  # Convert bytes/sec to Mbps
+        utilization = np.divide(traffic_speed, bandwidth, out=np.zeros_like(bandwidth), where=bandwidth != 0) * 100
+        return pd.DataFrame({"total_bandwidth": bandwidth, "traffic_speed": traffic_speed,
+                             "bandwidth_utilization": utilization}, index=index)
+
+    @timed_stage("influx.get_device_metrics")
+    def get_device_metrics(self, device_inventory, device_ips: List[str], start_date: datetime, end_date: datetime,
+                           duration_str: str) -> pd.DataFrame:
+        """Raw per-device KPIs: power (W), bandwidth and traffic (Mbps), utilization (%), PCR and power percentiles.
+
+        Three grouped queries cover every IP, however many sites the inventory spans.
+        """
+        aggregate_window, _ = self.determine_aggregate_window(duration_str)
+        inventory_by_ip = {device['ip_address']: device for device in device_inventory}
+
+        n = len(device_ips)
+        total_power = np.full(n, np.nan)
+        traffic = pd.DataFrame(np.nan, columns=["total_bandwidth", "traffic_speed", "bandwidth_utilization"],
+                               index=range(n))
         try:
-            result = self.query_api.query_data_frame(query)
-            print(result)
-            if isinstance(result, pd.DataFrame) and not result.empty:
-                total_power = result['_value'].sum()
-            else:
-                total_power = 0
+            total_power = self.get_device_totals(device_ips, start_date, end_date)["total_PIn"] \
+                .reindex(device_ips).to_numpy(dtype=float)
         except Exception as e:
-            print(f"Error fetching power consumption: {e}")
-            total_power = None
-
-        return total_power
-
-    def fetch_bandwidth_and_traffic(self, ip, start_time, end_time, aggregate_window):
-        query = f'''
-              from(bucket: "{self.bucket}")
-                |> range(start: {start_time}, stop: {end_time})
-                |> filter(fn: (r) => r["_measurement"] == "DeviceEngreeTraffic")
-                |> filter(fn: (r) => r["ApicController_IP"] == "{ip}")
-                |> filter(fn: (r) => r["_field"] == "bandwidth" or r["_field"] == "total_bytesRateLast")
-                |> aggregateWindow(every: {aggregate_window}, fn: mean, createEmpty: false)
-          '''
-
+            logger.error("Error fetching power consumption: %s", e)
         try:
-            result = self.query_api.query_data_frame(query)
-            print(result)
-            if isinstance(result, pd.DataFrame) and not result.empty:
-                bandwidth = result.loc[result['_field'] == 'bandwidth', '_value'].mean() / 1000  # Convert Kbps to Mbps
-                traffic_speed = result.loc[result[
-                                               '_field'] == 'total_bytesRateLast', '_value'].mean() * 8 / 1e6  # Convert bytes/sec to Mbps
-                # bandwidth_utilization = min((traffic_speed / bandwidth) * 100, 100) if bandwidth else 0
-                bandwidth_utilization = (traffic_speed / bandwidth) * 100 if bandwidth else 0
-            else:
-                bandwidth = traffic_speed = bandwidth_utilization = 0
+            traffic = self.get_device_traffic(device_ips, start_date, end_date, aggregate_window) \
+                .reindex(device_ips).reset_index(drop=True)
         except Exception as e:
-            print(f"Error fetching bandwidth and traffic: {e}")
-            bandwidth = traffic_speed = bandwidth_utilization = None
-
-        return bandwidth, traffic_speed, bandwidth_utilization
-
-    def convert_and_add_unit(self, total_power, bandwidth, traffic_speed, bandwidth_utilization, co2em):
-        # Convert and round total power to kW if greater than 1000W (1 kW)
-        if total_power > 1000:  # Convert to kW if power is greater than 1000W
-            total_power = round(total_power / 1000, 2)  # Convert from W to kW
-            power_unit = 'kW'
-        else:
-            total_power = round(total_power, 2)
-            power_unit = 'W'
-
-        # Convert and round bandwidth
-        if bandwidth > 1000:  # Convert to GPS if bandwidth is greater than 1000 Mbps (1 Gbps)
-            bandwidth = round(bandwidth / 1000, 2)  # Convert from Mbps to GPS
-            bandwidth_unit = 'GPS'
-        else:
-            bandwidth = round(bandwidth, 2)
-            bandwidth_unit = 'Mbps'
-
-        # Convert and round traffic speed
-        if traffic_speed > 1000:  # Convert to GPS if traffic speed is greater than 1000 Mbps (1 Gbps)
-            traffic_speed = round(traffic_speed / 1000, 2)  # Convert from Mbps to GPS
-            traffic_speed_unit = 'GPS'
-        else:
-            traffic_speed = round(traffic_speed, 2)
-            traffic_speed_unit = 'Mbps'
-
-        # Convert and round bandwidth utilization
-        bandwidth_utilization = round(bandwidth_utilization, 2)
-
-        # Convert and round CO2 emissions: if greater than 1000 grams (1 kg), convert to tons
-        if co2em >= 1000:  # Convert to tons if CO2 emissions are greater than or equal to 1000 grams
-            co2em = round(co2em / 1000, 3)  # Convert from grams to tons
-            co2em_unit = 'tons'
-        else:
-            co2em = round(co2em, 2)  # Round to 2 decimal places if less than 1 kg
-            co2em_unit = 'kgs'
-
-        return {
-            'total_power': f"{total_power} {power_unit}",
-            'bandwidth': f"{bandwidth} {bandwidth_unit}",
-            'traffic_speed': f"{traffic_speed} {traffic_speed_unit}",
-            'bandwidth_utilization': f"{bandwidth_utilization} ",
-            'co2emissions': f"{co2em} {co2em_unit}"
-        }
-
-    def get_top_5_devices(self,device_inventory, device_ips: List[str], start_date: datetime, end_date: datetime, duration_str: str) -> \
-    List[dict]:
-        top_devices = []
-        start_time = start_date.isoformat() + 'Z'
-        end_time = end_date.isoformat() + 'Z'
+            logger.error("Error fetching bandwidth and traffic: %s", e)
 
-        aggregate_window, time_format = self.determine_aggregate_window(duration_str)
-
-        for ip in device_ips:
-            # Fetch data
-
-            total_power = self.fetch_device_power_consumption(ip, start_time, end_time, aggregate_window)
-            print("ip, start_time, end_time,aggregate_window",ip, start_time, end_time,aggregate_window)
-            bandwidth, traffic_speed, bandwidth_utilization = self.fetch_bandwidth_and_traffic(ip, start_time, end_time,
-                                                                                               aggregate_window)
-
-
-            print(total_power,"dsajfdkjdkjd")
-            print(traffic_speed,"sd;f;sdl;fl;gls")
-            pcr = total_power / traffic_speed if traffic_speed else None
-            co2em=(total_power/1000) *0.4041
-            print("co2emissions ", co2em)
-            print(pcr,"PCR")
-
-
-            # Convert and format the data with units
-            converted_data = self.convert_and_add_unit(total_power, bandwidth, traffic_speed, bandwidth_utilization,
-                                                       co2em)
-
-            # Example logic to populate id and device_name (replace with actual data source if available)
-            # device_name = f"Device_{ip}"  # Replace with real device name logic
-            # device_id = hash(ip)  # Replace with actual ID logic
-            device_info = next((device for device in device_inventory if device['ip_address'] == ip), None)
-            print(device_info)
-            print("pcr ", pcr)
-            print("co2emissions ", co2em)
-            print(total_power,"")
-            print(" bandwidth, traffic_speed, bandwidth_utilization ", bandwidth, traffic_speed, bandwidth_utilization )
-            if device_info:
-                device_id = device_info['id']
-                device_name = device_info['device_name']
-
-            top_devices.append({
-                'id': device_id,
-                'device_name': device_name,
-                'total_power': converted_data['total_power'],
-                'total_bandwidth': converted_data['bandwidth'],
-                'traffic_speed': converted_data['traffic_speed'],
-                'bandwidth_utilization': converted_data['bandwidth_utilization'],
-                'pcr': round(pcr, 4) if pcr else 0,
-                'co2emmissions': converted_data['co2emissions'],
-                'ip_address': ip
-            })
-        # Sort devices by 'total_power' in descending order
-        sorted_devices = sorted(top_devices, key=lambda x: x['total_power'], reverse=True)
-
-        # Get the top 5 devices
-        top_5_devices = sorted_devices[:5]
-
-        # Get the bottom 5 devices (avoid duplicates if less than 10 devices exist)
-        bottom_5_devices = sorted_devices[-5:] if len(sorted_devices) > 5 else sorted_devices[5:]
-
-        # Print results
-
-        return top_5_devices,bottom_5_devices
-
-    def get_24hrack_power(self,apic_ips, rack_id,start_date: datetime, end_date: datetime, duration_str: str)-> List[dict]:
-        apic_ip_list = [ip[0] for ip in apic_ips if ip[0]]
-        print(apic_ip_list)
-        if not apic_ip_list:
-            return []
-        start_time = start_date.isoformat() + 'Z'
-        end_time = end_date.isoformat() + 'Z'
-
-        # Define the aggregate window and time format based on the duration string
-        if duration_str in ["24 hours"]:
-            aggregate_window = "1h"
-            time_format = '%Y-%m-%d %H:00'
-        elif duration_str in ["7 Days", "Current Month", "Last Month"]:
-            aggregate_window = "1d"
-            time_format = '%Y-%m-%d'
-        else:  # For "last 6 months", "last year", "current year",
-            aggregate_window = "1m"
-            time_format = '%Y-%m'
-
-
-        rack_data = []
-        total_drawn, total_supplied = 0, 0
-
-        for apic_ip in apic_ip_list:
-            print(apic_ip)
-            query = f'''from(bucket: "Dcs_db")
-                  |> range(start: {start_time}, stop: {end_time})
-                  |> filter(fn: (r) => r["_measurement"] == "DevicePSU")
-                  |> filter(fn: (r) => r["ApicController_IP"] == "{apic_ip}")
-                  |> sum()
-                  |> yield(name: "total_sum")'''
-            try:
-                result = self.query_api.query(query)
-
-                drawnAvg, suppliedAvg = None, None
-
-                for table in result:
-                    for record in table.records:
-                        if record.get_field() == "total_POut":
-                            drawnAvg = record.get_value()
-                        elif record.get_field() == "total_PIn":
-                            suppliedAvg = record.get_value()
-
-                        if drawnAvg is not None and suppliedAvg is not None:
-                            total_drawn += drawnAvg
-                            total_supplied += suppliedAvg
-
-                power_utilization = None
-                pue = None
-                if total_supplied > 0:
-                    power_utilization = (total_drawn / total_supplied)
-                if total_drawn > 0:
-                    pue = ((total_supplied / total_drawn) - 1)
-
-                rack_data.append({
-                    "rack_id": rack_id,
-                    "power_utilization": round(power_utilization, 2) if power_utilization is not None else 0,
-                    "power_input": total_supplied,
-                    "power_output": total_drawn,
-                    "pue": round(pue, 2) if pue is not None else 0,
-
-                })
-
-            except Exception as e:
-                print(f"Error querying InfluxDB for {apic_ip}: {e}")
-
-        return rack_data
-
-    def get_24h_rack_datatraffic(self,apic_ips, rack_id,start_date,end_date, duration) -> List[dict]:
-        apic_ip_list = [ip[0] for ip in apic_ips if ip[0]]
-        print(apic_ip_list)
-        if not apic_ip_list:
-            return []
-        start_time = start_date.isoformat() + 'Z'
-        end_time = end_date.isoformat() + 'Z'
-
-        # Define the aggregate window and time format based on the duration string
-        if duration in ["24 hours"]:
-            aggregate_window = "1h"
-            time_format = '%Y-%m-%d %H:00'
-        elif duration in ["7 Days", "Current Month", "Last Month"]:
-            aggregate_window = "1d"
-            time_format = '%Y-%m-%d'
-        else:  # For "last 6 months", "last year", "current year",
-            aggregate_window = "1m"
-            time_format = '%Y-%m'
-        start_range = "-24h"
-        Traffic_rack_data = []
-        total_byterate = 0
-
-        for apic_ip in apic_ip_list:
-            print(apic_ip)
-            query = f'''from(bucket: "Dcs_db")
-                  |> range(start: {start_time}, stop: {end_time})
-                  |> filter(fn: (r) => r["_measurement"] == "DeviceEngreeTraffic")
-                  |> filter(fn: (r) => r["ApicController_IP"] == "{apic_ip}")
-                  |> sum()
-                  |> yield(name: "total_sum")'''
-            try:
-                result = self.query_api.query(query)
-                byterate = None
-
-                for table in result:
-                    for record in table.records:
-                        if record.get_field() == "total_bytesRateLast":
-                            byterate = record.get_value()
-                        else:
-                            byterate = 0
-                        total_byterate += byterate
-                print(total_byterate, "total_bytesRateLast")
-
-                Traffic_rack_data.append({
-                    "rack_id": rack_id,
-                    "traffic_through": total_byterate})
-            except Exception as e:
-                print(f"Error querying InfluxDB for {apic_ip}: {e}")
-
-        return Traffic_rack_data
+        percentiles = pd.DataFrame(index=range(n), columns=[f"power_{name}" for name in POWER_PERCENTILES] +
+                                   ["power_max"], dtype=float)
+        try:
+            percentiles = self.get_device_power_percentiles(device_ips, start_date, end_date) \
+                .reindex(device_ips).reset_index(drop=True)
+        except Exception as e:
+            logger.error("Error fetching power percentiles: %s", e)
+
+        traffic_speed = traffic["traffic_speed"].to_numpy(dtype=float)
+        pcr = np.divide(total_power, traffic_speed, out=np.zeros(n), where=traffic_speed > 0).round(4)
+        return pd.DataFrame({
+            'id': pd.array([inventory_by_ip.get(ip, {}).get('id') for ip in device_ips], dtype='Int64'),
+            'device_name': [inventory_by_ip.get(ip, {}).get('device_name') for ip in device_ips],
+            'ip_address': device_ips,
+            'site_id': pd.array([inventory_by_ip.get(ip, {}).get('site_id') for ip in device_ips], dtype='Int64'),
+            'total_power': total_power,
+            'total_bandwidth': traffic["total_bandwidth"].to_numpy(dtype=float),
+            'traffic_speed': traffic_speed,
+            'bandwidth_utilization': traffic["bandwidth_utilization"].to_numpy(dtype=float),
+            'pcr': pcr,
+            **{column: percentiles[column].to_numpy(dtype=float) for column in percentiles.columns},
+        })
@@ -1,10 +1,29 @@
-from typing import List, Dict
+import logging
+from typing import List, Dict, Optional
+
+import pandas as pd
 from Database.db_connector import DBConnection
-from Models.model import Device, DeviceInventory, Site
+from metrics.metrics import timed_stage
+from Models.model import Building, Device, DeviceInventory, Rack, Site, rack_building_association
+from sqlalchemy import String, func, inspect, literal
 from sqlalchemy.orm import joinedload
+
+logger = logging.getLogger(__name__)
+
 class SiteRepository:
-    def __init__(self):
-        self.db_connection = DBConnection()
+    def __init__(self, db_connection=None):
+        self.db_connection = db_connection or DBConnection()
+        self._has_zone = None
+
+    def _zone_column(self):
+        """Site.zone, or NULL (the default zone) on a database whose site table predates the column."""
+        if self._has_zone is None:
+            columns = inspect(self.db_connection.engine).get_columns(Site.__tablename__)
+            self._has_zone = any(column["name"] == "zone" for column in columns)
+            if not self._has_zone:
+                logger.warning("Table site has no zone column, every site uses the default grid zone; add it with: "
+                               "ALTER TABLE site ADD COLUMN zone VARCHAR(16) NULL DEFAULT 'AE';")
+        return Site.zone if self._has_zone else literal(None, String).label("zone")
 
     def get_devices_by_site_id(self, site_id: int):
         """Fetch devices using eager loading to prevent session detachment issues"""
@@ -17,13 +36,29 @@ class SiteRepository:
             )
             return devices
 
-    def get_device_inventory_by_site_id(self, site_id: int) -> List[Dict[str, any]]:
+    @timed_stage("site.get_device_sites")
+    def get_device_sites(self, site_id: Optional[int] = None) -> pd.DataFrame:
+        """(ip, site_id, site_name, zone) of every device with an IP, for one site or, with None, all sites."""
+        with self.db_connection.session_scope() as session:
+            query = (
+                session.query(Device.ip_address.label('ip'), Site.id.label('site_id'), Site.site_name,
+                              self._zone_column())
+                .join(Site, Device.site_id == Site.id)
+                .filter(Device.ip_address.isnot(None))
+            )
+            if site_id is not None:
+                query = query.filter(Device.site_id == site_id)
+            return pd.DataFrame(query.all(), columns=['ip', 'site_id', 'site_name', 'zone'])
+
+    @timed_stage("site.get_device_inventory_by_site_id")
+    def get_device_inventory_by_site_id(self, site_id: Optional[int]) -> List[Dict[str, any]]:
         with self.db_connection.session_scope() as session:
             device_inventory_data = (
                 session.query(
                     DeviceInventory.id,
                     DeviceInventory.device_name,
                     Device.ip_address.label('ip_address'),
+                    Site.id.label('site_id'),
                     Site.site_name,
                     DeviceInventory.hardware_version,
                     DeviceInventory.manufacturer,
@@ -35,16 +70,17 @@ class SiteRepository:
                 .join(Device,
                       DeviceInventory.apic_controller_id == Device.id)
                 .join(Site, DeviceInventory.site_id == Site.id)
-                .filter(DeviceInventory.site_id == site_id)
-                .all()
             )
+            if site_id is not None:
+                device_inventory_data = device_inventory_data.filter(DeviceInventory.site_id == site_id)
 
             device_inventory_dicts = []
-            for data in device_inventory_data:
+            for data in device_inventory_data.all():
                 device_info = {
                     "id": data.id,
                     "device_name": data.device_name,
                     "ip_address": data.ip_address,
+                    "site_id": data.site_id,
                     "site_name": data.site_name,
                     "hardware_version": data.hardware_version,
                     "manufacturer": data.manufacturer,
@@ -56,3 +92,54 @@ class SiteRepository:
                 device_inventory_dicts.append(device_info)
 
             return device_inventory_dicts
+
+    @timed_stage("site.get_site_zone")
+    def get_site_zone(self, site_id: int):
+        """electricityMap zone of the site's grid, None when it is not set."""
+        with self.db_connection.session_scope() as session:
+            row = session.query(self._zone_column()).filter(Site.id == site_id).first()
+            return row[0] if row else None
+
+    @timed_stage("site.get_rack_ips_by_site_id")
+    def get_rack_ips_by_site_id(self, site_id: Optional[int]) -> pd.DataFrame:
+        """Distinct (ip, rack) pairs linking each controller IP to the racks it reports power for."""
+        with self.db_connection.session_scope() as session:
+            query = (
+                session.query(Device.ip_address.label('ip'), Rack.id.label('rack_id'), Rack.rack_name)
+                .join(DeviceInventory, Device.id == DeviceInventory.apic_controller_id)
+                .join(Rack, Rack.id == DeviceInventory.rack_id)
+                .filter(Device.ip_address.isnot(None))
+            )
+            if site_id is not None:
+                query = query.filter(Rack.site_id == site_id)
+            return pd.DataFrame(query.distinct().all(), columns=['ip', 'rack_id', 'rack_name'])
+
+    @timed_stage("site.get_rack_details")
+    def get_rack_details(self, site_id: Optional[int]) -> pd.DataFrame:
+        """rack_id, rack_name, building, site_name and num_devices of every rack, in three queries in total."""
+        with self.db_connection.session_scope() as session:
+            racks = (
+                session.query(Rack.id.label('rack_id'), Rack.rack_name, Site.site_name)
+                .outerjoin(Site, Rack.site_id == Site.id)
+            )
+            buildings = (
+                session.query(rack_building_association.c.rack_id, func.min(Building.building_name))
+                .join(Building, Building.id == rack_building_association.c.building_id)
+                .join(Rack, Rack.id == rack_building_association.c.rack_id)
+                .group_by(rack_building_association.c.rack_id)
+            )
+            devices = (
+                session.query(Device.rack_id, func.count(Device.id))
+                .join(Rack, Rack.id == Device.rack_id)
+                .group_by(Device.rack_id)
+            )
+            if site_id is not None:
+                racks, buildings, devices = (query.filter(Rack.site_id == site_id)
+                                             for query in (racks, buildings, devices))
+
+            frame = pd.DataFrame(racks.all(), columns=['rack_id', 'rack_name', 'site_name'])
+            building_by_rack = dict(buildings.all())
+            devices_by_rack = dict(devices.all())
+            frame['building'] = frame['rack_id'].map(building_by_rack)
+            frame['num_devices'] = frame['rack_id'].map(devices_by_rack).fillna(0).astype(int)
+            return frame
@@ -1,177 +1,253 @@
 
 import logging
+import os
+
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-# import matplotlib.pyplot as plt
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 
+from metrics.metrics import observe_stage
+from power_data.dataset import COLUMN_UNITS, column_quantity
+from power_data.quantity import Quantity
+from report.charts import ChartFlowable, get_chart_pool, render_gauge, render_heatmap, render_line_chart, submit_chart
+from report.downsample import DOWNSAMPLE_METHODS, downsample
+from report.periods import find_periods, format_duration, worst_periods
+from report.profiles import DEFAULT_PROFILE, PROFILES, report_fonts
+from report.streaming import StreamingTable
+from report.tables import build_table
+from report.units import format_quantity
+from report.vector_charts import gauge_drawing, heatmap_drawing, line_chart_drawing
+
+logger = logging.getLogger(__name__)
+
+CHART_BACKENDS = ("matplotlib", "reportlab")
+
+# Underperforming periods listed per metric; the rest are summarized in the lead-in sentence
+WORST_PERIODS_SHOWN = 10
+
+DEVICE_TABLE_COLUMNS = ["device_name", "ip_address", "total_power", "traffic_speed", "pcr", "co2emmissions"]
+SITE_TABLE_COLUMNS = ["site_name", "num_devices", "energy_efficiency", "power_efficiency", "energy_kwh", "co2_kg",
+                      "top_device"]
+MOVEMENT_TABLE_COLUMNS = ["device_name", "ip_address", "rank", "previous_rank", "rank_change", "energy_kwh",
+                          "previous_energy_kwh"]
+PEAK_DEVICE_COLUMNS = ["device_name", "ip_address", "power_p50", "power_p95", "power_p99", "power_max"]
+PEAK_RACK_COLUMNS = ["rack_name", "site_name", "power_p50_kw", "power_p95_kw", "power_p99_kw", "power_max_kw"]
+# Racks listed in the peak power table, highest p95 first
+PEAK_RACKS_SHOWN = 10
+COMPARISON_LABELS = {"eer": "EER", "pue": "PUE", "energy_kwh": "Energy", "co2_kg": "CO2 Emissions"}
+RACK_TABLE_COLUMNS = ["rack_name", "building", "site_name", "num_devices", "eer", "pue", "power_input_kw",
+                      "data_traffic_gb", "pcr"]
+
+# Racks with the highest peak input power shown in the rack heatmap
+RACK_HEATMAP_ROWS = 30
+
+# Rack appendices longer than this are laid out one page at a time (see report.streaming)
+STREAMING_ROW_THRESHOLD = 1000
+
+class RenderContext:
+    """Render state of one report: its profile, fonts and paragraph styles, and whether the rack appendix
+    is streamed. Built per generate_report call, so concurrent reports never share it."""
+
+    def __init__(self, profile, streaming):
+        self.profile = profile
+        self.streaming = streaming
+        self.font_name, self.bold_font_name = report_fonts(profile)
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(name='Title', parent=styles['Heading1'], fontName=self.bold_font_name, fontSize=18, alignment=1, spaceAfter=20)
+        self.header_style = ParagraphStyle(name='Header', parent=styles['Heading2'], fontName=self.bold_font_name, fontSize=14, alignment=0, spaceAfter=10)
+        self.stat_style = ParagraphStyle(name='Stat', parent=styles['Title'], fontName=self.bold_font_name, fontSize=28,  alignment=0)
+        self.desc_style = ParagraphStyle(name='Description', parent=styles['BodyText'], fontName=self.font_name, fontSize=12, alignment=4)
+        self.footer_style = ParagraphStyle(name='Footer', parent=styles['Normal'], fontName=self.font_name, fontSize=10, alignment=1, textColor=colors.HexColor('#808080'))
+
+
 class CreativeEnergyReport:
-    def __init__(self):
-        self.filename = ''
-        self.styles = getSampleStyleSheet()
-        self.prepare_styles()
-
-    def prepare_styles(self):
-        self.title_style = ParagraphStyle(name='Title', parent=self.styles['Heading1'], fontSize=18, alignment=1, spaceAfter=20)
-        self.header_style = ParagraphStyle(name='Header', parent=self.styles['Heading2'], fontSize=14, alignment=0, spaceAfter=10)
-        self.stat_style = ParagraphStyle(name='Stat', parent=self.styles['Title'], fontSize=28,  alignment=0)
-        self.desc_style = ParagraphStyle(name='Description', parent=self.styles['BodyText'], fontSize=12, alignment=4)
-        self.footer_style = ParagraphStyle(name='Footer', parent=self.styles['Normal'], fontSize=10, alignment=1, textColor=colors.HexColor('#808080'))
-
-
-    def generate_report(self, powerdata, summary_cards, site_name, duration,top_devices,bottom_devices,rack_details,filenames):
-        self.filename=filenames
-        self.data = pd.DataFrame(powerdata)
-        self.data['time'] = pd.to_datetime(self.data['time'])
+    def __init__(self, chart_backend=None):
+        self.chart_backend = chart_backend or os.getenv("CHART_BACKEND", "matplotlib")
+        self.downsample_method = os.getenv("CHART_DOWNSAMPLE", "lttb")
+        if self.downsample_method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"Unsupported downsampling method: {self.downsample_method}")
+        if self.chart_backend not in CHART_BACKENDS:
+            raise ValueError(f"Unsupported chart backend: {self.chart_backend}")
+        if self.chart_backend == "matplotlib":
+            # Start the chart workers with the daemon so the first report doesn't pay for spawning them
+            get_chart_pool()
+
+    def generate_report(self, dataset, filenames, profile=None, streaming=None):
+        # One instance serves every report of the daemon; per-report state lives in the context
+        context = RenderContext(profile or PROFILES[DEFAULT_PROFILE],
+                                len(dataset.racks) > STREAMING_ROW_THRESHOLD if streaming is None else streaming)
+        data = dataset.energy
+        site_name, duration = dataset.site_name, dataset.duration
         # Calculate Performance Score
-        avg_eer = self.data['energy_efficiency'].mean()
-        avg_pue = self.data['power_efficiency'].mean()
+        avg_eer = data['energy_efficiency'].mean()
+        avg_pue = data['power_efficiency'].mean()
         performance_score = (avg_eer / avg_pue) * 100
         performance_summary = "The data center has demonstrated optimal energy efficiency with minimal wastage." if performance_score >= 75 else "The data center is operating at moderate efficiency, with room for improvements." if performance_score >= 50 else "The data center requires significant optimization efforts to improve efficiency."
 
         # Identify Zero Data Points
-        zero_data_points = self.data[(self.data['power_efficiency'] == 0) | (self.data['energy_efficiency'] == 0)]
+        zero_data_points = data[(data['power_efficiency'] == 0) | (data['energy_efficiency'] == 0)]
 
-        # Generate charts and gauges
-        self.create_gauge(self.data['power_efficiency'].mean(), 4, 'Power Usage Effectiveness', 'PUE')
-        self.create_gauge(self.data['energy_efficiency'].mean(), 2, 'Energy Efficiency Ratio', 'EER')
-        self.generate_eer_graph()
-        self.generate_pue_graph()
+        # Charts come back as flowables: pool-rendered image placeholders or native vector drawings
+        pue_gauge = self.create_gauge(data['power_efficiency'].mean(), 4, 'Power Usage Effectiveness', context)
+        eer_gauge = self.create_gauge(data['energy_efficiency'].mean(), 2, 'Energy Efficiency Ratio', context)
+        eer_chart = self.generate_eer_graph(data, context)
+        pue_chart = self.generate_pue_graph(data, context)
 
         # Create PDF Document
-        doc = SimpleDocTemplate(self.filename, pagesize=letter)
+        doc = SimpleDocTemplate(filenames, pagesize=letter, pageCompression=context.profile.page_compression)
         elements = []
 
         # Cover Page
-        elements.append(Paragraph(f"Energy Consumption Report for {site_name}", self.title_style))
-        elements.append(Paragraph(f"Reporting Period: {duration}", self.header_style))
+        elements.append(Paragraph(f"Energy Consumption Report for {site_name}", context.title_style))
+        elements.append(Paragraph(f"Reporting Period: {duration}", context.header_style))
         elements.append(Spacer(1, 20))
 
         intro = Paragraph(
             f"This comprehensive report provides detailed insights into the energy consumption patterns and efficiency metrics for <b>{site_name}</b>. The data covers the specified reporting period, highlighting key performance indicators and offering actionable insights.",
-            self.desc_style)
+            context.desc_style)
         elements.append(intro)
         elements.append(Spacer(1, 20))
-        elements.append(Paragraph(performance_summary, self.desc_style))
+        elements.append(Paragraph(performance_summary, context.desc_style))
 
         # Summary Section
-        elements.append(Paragraph(f"Energy Consumption Report Summary for {site_name}", self.header_style))
-        elements.append(Paragraph(f"Overall Performance Score: {performance_score:.2f}", self.desc_style))
-        # elements.append(Paragraph("<b>Summary of Key Metrics</b>", self.header_style))
-        # self.add_summary_table(elements, summary_cards)
+        elements.append(Paragraph(f"Energy Consumption Report Summary for {site_name}", context.header_style))
+        elements.append(Paragraph(f"Overall Performance Score: {performance_score:.2f}", context.desc_style))
+        # elements.append(Paragraph("<b>Summary of Key Metrics</b>", context.header_style))
+        # self.add_summary_table(elements, dataset.summary, context)
+        if dataset.sites is not None:
+            elements.append(Paragraph("<b>Site Comparison</b>", context.header_style))
+            elements.append(Paragraph(
+                "The table below compares every site over the reporting period, ordered by carbon emissions. EER and PUE are computed from each site's total input and output power, and the top device is the site's highest-ranked device.",
+                context.desc_style))
+            elements.append(Spacer(1, 20))
+            self.add_site_table(elements, dataset.sites, context)
+        if dataset.comparison is not None:
+            previous_start, previous_end = dataset.previous_period
+            elements.append(Paragraph("<b>Comparison with the Previous Period</b>", context.header_style))
+            elements.append(Paragraph(
+                f"The table below compares this reporting period with the equivalent period before it ({previous_start:%Y-%m-%d %H:%M} to {previous_end:%Y-%m-%d %H:%M}). Changes are this period minus the previous one.",
+                context.desc_style))
+            elements.append(Spacer(1, 20))
+            self.add_comparison_tables(elements, dataset.comparison, dataset.device_movements, context)
         # Top Devices Utilization Section
-        elements.append(Paragraph("<b>Top 5 Devices Utilization</b>", self.header_style))
+        elements.append(Paragraph("<b>Top 5 Devices Utilization</b>", context.header_style))
         elements.append(Paragraph(
             "The table below highlights the top devices based on their power consumption, bandwidth utilization, and overall efficiency metrics. These devices play a critical role in the site's energy consumption profile, and understanding their performance can help identify areas for optimization and efficiency improvements.",
-            self.desc_style))
-        print("good tile hhere")
+            context.desc_style))
         elements.append(Spacer(1, 20))
-        self.add_top_devices_table(elements, top_devices)
+        self.add_top_devices_table(elements, dataset.top_devices, context)
 
 
 
         # Top Devices Utilization Section
-        elements.append(Paragraph("<b>Bottom 5 Devices Utilization</b>", self.header_style))
+        elements.append(Paragraph("<b>Bottom 5 Devices Utilization</b>", context.header_style))
         elements.append(Paragraph(
             "The table below highlights the bottom devices based on their power consumption, bandwidth utilization, and overall efficiency metrics. These devices play a critical role in the site's energy consumption profile, and understanding their performance can help identify areas for optimization and efficiency improvements.",
-            self.desc_style))
-        print("good tile hhere")
+            context.desc_style))
         elements.append(Spacer(1, 20))
-        self.add_top_devices_table(elements, bottom_devices)
+        self.add_top_devices_table(elements, dataset.bottom_devices, context)
+
+        # Peak Power Section
+        elements.append(Paragraph("<b>Peak Power Distribution</b>", context.header_style))
+        elements.append(Paragraph(
+            "Averages hide the peaks that matter for capacity planning. The tables below give the median (P50), 95th and 99th percentile and maximum input power of the top devices, and of the racks with the highest 95th percentile over 15-minute samples.",
+            context.desc_style))
+        elements.append(Spacer(1, 20))
+        self.add_peak_tables(elements, dataset.top_devices, dataset.racks, context)
 
         elements.append(Spacer(1, 90))
 
 
         # Average Metrics Gauges
-        avg_eer = self.data['energy_efficiency'].mean()
-        avg_pue = self.data['power_efficiency'].mean()
-        elements.append(Paragraph("<b>Average Energy Efficiency Metrics</b>", self.header_style))
+        avg_eer = data['energy_efficiency'].mean()
+        avg_pue = data['power_efficiency'].mean()
+        elements.append(Paragraph("<b>Average Energy Efficiency Metrics</b>", context.header_style))
         elements.append(Spacer(1, 10))
-        elements.append(self.create_image_table(["PUE.png", "EER.png"]))
+        elements.append(self.create_image_table([pue_gauge, eer_gauge]))
         elements.append(Spacer(1, 10))
 
-        elements.append(Paragraph("The above gauges represent the average Power Usage Effectiveness (PUE) and Energy Efficiency Ratio (EER) for the reporting period. These metrics are crucial indicators of overall site performance.", self.desc_style))
+        elements.append(Paragraph("The above gauges represent the average Power Usage Effectiveness (PUE) and Energy Efficiency Ratio (EER) for the reporting period. These metrics are crucial indicators of overall site performance.", context.desc_style))
         elements.append(Spacer(1, 20))
 
 
 
         # Energy Efficiency Analysis
-        elements.append(Paragraph("<b>Energy Efficiency Over Time</b>", self.header_style))
-        elements.append(Paragraph("The Energy Efficiency Ratio (EER) indicates the ratio of cooling output to the electrical energy input. Higher EER values signify better energy efficiency. Below is the trend of EER over the reporting period:", self.desc_style))
+        elements.append(Paragraph("<b>Energy Efficiency Over Time</b>", context.header_style))
+        elements.append(Paragraph("The Energy Efficiency Ratio (EER) indicates the ratio of cooling output to the electrical energy input. Higher EER values signify better energy efficiency. Below is the trend of EER over the reporting period:", context.desc_style))
         elements.append(Spacer(1, 10))
-        elements.append(Image("eer_chart.png", width=400, height=200))
+        elements.append(eer_chart)
         elements.append(Spacer(1, 20))
 
         # EER Conclusion
-        underperforming_points = self.data[self.data['energy_efficiency'] < 0.5]
-        if not underperforming_points.empty:
+        eer_periods = find_periods(data['time'], data['energy_efficiency'], data['energy_efficiency'] < 0.5)
+        if not eer_periods.empty:
             elements.append(Paragraph(
-                f"Several data points showed low energy efficiency (EER < 0.5). Notable underperforming periods include:",
-                self.desc_style))
-            for _, row in underperforming_points.iterrows():
-                elements.append(Paragraph(
-                    f"-{row['time'].strftime('%Y-%m-%d %H:%M')} with an EER of {row['energy_efficiency']:.2f}",
-                    self.desc_style))
+                f"Several data points showed low energy efficiency (EER < 0.5): {eer_periods['buckets'].sum()} data points across {len(eer_periods)} periods. The lowest-EER periods were:",
+                context.desc_style))
+            elements.append(Spacer(1, 10))
+            self.add_period_table(elements, worst_periods(eer_periods, 'min', True, WORST_PERIODS_SHOWN), 'EER', context)
         else:
-            elements.append(Paragraph("No significant periods of low energy efficiency detected.", self.desc_style))
+            elements.append(Paragraph("No significant periods of low energy efficiency detected.", context.desc_style))
         eer_conclusion = "high energy efficiency throughout the period." if avg_eer >= 1.5 else "moderate energy efficiency with potential for improvement." if avg_eer >= 0.5 else "low energy efficiency, requiring significant optimization efforts."
-        elements.append(Paragraph(f"The average EER of <font color='#1B98E0'>{avg_eer:.2f}</font> indicates <b><font color='#1B98E0'>{eer_conclusion}</font></b>", self.desc_style))
+        elements.append(Paragraph(f"The average EER of <font color='#1B98E0'>{avg_eer:.2f}</font> indicates <b><font color='#1B98E0'>{eer_conclusion}</font></b>", context.desc_style))
 
         # Power Utilization Analysis
-        elements.append(Paragraph("<b>Power Utilization Over Time</b>", self.header_style))
-        elements.append(Paragraph("Power Usage Effectiveness (PUE) measures the total energy consumption compared to the energy used solely by IT equipment. Lower PUE values represent more efficient energy use. The graph below shows the PUE trend over the reporting period:", self.desc_style))
+        elements.append(Paragraph("<b>Power Utilization Over Time</b>", context.header_style))
+        elements.append(Paragraph("Power Usage Effectiveness (PUE) measures the total energy consumption compared to the energy used solely by IT equipment. Lower PUE values represent more efficient energy use. The graph below shows the PUE trend over the reporting period:", context.desc_style))
         elements.append(Spacer(1, 10))
-        elements.append(Image("pue_chart.png", width=400, height=200))
+        elements.append(pue_chart)
         elements.append(Spacer(1, 20))
 
         # PUE Conclusion
-        underperforming_pue_points = self.data[self.data['power_efficiency'] > 2.0]
-        if not underperforming_pue_points.empty:
+        pue_periods = find_periods(data['time'], data['power_efficiency'], data['power_efficiency'] > 2.0)
+        if not pue_periods.empty:
             elements.append(Paragraph(
-                f"Several data points showed poor power efficiency (PUE > 2.0). Notable underperforming periods include:",
-                self.desc_style))
-            for _, row in underperforming_pue_points.iterrows():
-                elements.append(
-                    Paragraph(f"- {row['time'].strftime('%Y-%m-%d %H:%M')} with a PUE of {row['power_efficiency']:.2f}",
-                              self.desc_style))
+                f"Several data points showed poor power efficiency (PUE > 2.0): {pue_periods['buckets'].sum()} data points across {len(pue_periods)} periods. The highest-PUE periods were:",
+                context.desc_style))
+            elements.append(Spacer(1, 10))
+            self.add_period_table(elements, worst_periods(pue_periods, 'max', False, WORST_PERIODS_SHOWN), 'PUE', context)
         else:
-            elements.append(Paragraph("No significant periods of poor power efficiency detected.", self.desc_style))
+            elements.append(Paragraph("No significant periods of poor power efficiency detected.", context.desc_style))
 
         pue_conclusion = "excellent energy efficiency." if avg_pue <= 1.5 else "moderate efficiency with room for improvement." if avg_pue <= 2.0 else "inefficient performance, necessitating immediate action."
-        elements.append(Paragraph(f"<b>Conclusion:</b> The average PUE of <font color='#1678B5'>{avg_pue:.2f}</font> indicates <b><font color='#1678B5'>{pue_conclusion}</font></b>", self.desc_style))
+        elements.append(Paragraph(f"<b>Conclusion:</b> The average PUE of <font color='#1678B5'>{avg_pue:.2f}</font> indicates <b><font color='#1678B5'>{pue_conclusion}</font></b>", context.desc_style))
 
 
         # Racks Utilization
-        elements.append(Paragraph(f"<b>{site_name}'s Rack  wise Utilization</b>", self.header_style))
+        elements.append(Paragraph(f"<b>{site_name}'s Rack  wise Utilization</b>", context.header_style))
         elements.append(Paragraph(
-            "The following table provides an overview of rack performance, showcasing power consumption, bandwidth utilization, and efficiency metrics. Understanding these parameters helps in identifying optimization opportunities and enhancing overall operational efficiency.",  self.desc_style))
+            "The following table provides an overview of rack performance, showcasing power consumption, bandwidth utilization, and efficiency metrics. Understanding these parameters helps in identifying optimization opportunities and enhancing overall operational efficiency.",  context.desc_style))
 
         elements.append(Spacer(1, 20))
-        self.add_rack_table(elements, rack_details)
+        if dataset.rack_series is not None and not dataset.rack_series.empty:
+            elements.append(Paragraph(
+                f"The heatmap below shows each rack's input power over the reporting period, so the hours or days a rack ran hot stand out. Up to {RACK_HEATMAP_ROWS} racks with the highest peak are shown.",
+                context.desc_style))
+            elements.append(Spacer(1, 10))
+            elements.append(self.generate_rack_heatmap(dataset.rack_series, context))
+            elements.append(Spacer(1, 20))
+        self.add_rack_table(elements, dataset.racks, context)
 
 
 
 
         # Final Conclusion
         overall_conclusion = "The site has demonstrated optimal performance across the board." if avg_eer >= 0.5 else "There are noticeable inefficiencies that should be addressed to improve overall performance."
-        elements.append(Paragraph(f"<b>Overall Conclusion:</b> <font color='#003366'>{overall_conclusion}</font>", self.header_style))
+        elements.append(Paragraph(f"<b>Overall Conclusion:</b> <font color='#003366'>{overall_conclusion}</font>", context.header_style))
         elements.append(Spacer(1, 20))
 
         # Footer
-        elements.append(Paragraph("Generated by <font color='#00509E'>Nets International</font> | 2025", self.footer_style))
+        elements.append(Paragraph("Generated by <font color='#00509E'>Nets International</font> | 2025", context.footer_style))
 
         # Build PDF
-        doc.build(elements)
-        print(f"Report generated successfully: {self.filename}")
+        with observe_stage("doc_build"):
+            doc.build(elements)
+        logger.info("Report generated successfully: %s", filenames)
 
-    def add_summary_table(self, elements, summary_cards):
+    def add_summary_table(self, elements, summary_cards, context):
         headers = [key.replace('_', ' ').title() for key in summary_cards.keys()]
         values = [str(value) for value in summary_cards.values()]
 
@@ -182,6 +258,7 @@ class CreativeEnergyReport:
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#9cc993')),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, -1), context.font_name),
             ('FONTSIZE', (0, 0), (-1, -1), 12),
             ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
             ('GRID', (0, 0), (-1, -1), 1, colors.white)
@@ -189,111 +266,155 @@ class CreativeEnergyReport:
         elements.append(table)
         elements.append(Spacer(1, 20))
 
-    def create_image_table(self, image_paths):
-        images = [Image(img, width=200, height=120) for img in image_paths]
-        return Table([images], colWidths=[200, 200])
-
-    def create_gauge(self, value, max_value, title, filename):
-        color = '#448c35' if value <= 1.5 else '#1678b5' if value <= 2.0 else '#f5113b'
-        fig, ax = plt.subplots(figsize=(4, 3), subplot_kw={'projection': 'polar'})
-        ax.set_theta_offset(np.pi)
-        ax.set_theta_direction(-1)
-        ax.set_axis_off()
-        angle = np.pi * (value / max_value)
-        ax.barh(1, angle, left=0, height=0.3, color=color)
-        ax.barh(1, np.pi - angle, left=angle, height=0.3, color='lightgrey')
-        ax.text(0, 0, f'{value:.2f}', ha='center', va='center', fontsize=18, fontweight='bold')
-        plt.title(title, fontsize=12, color='grey', pad=15)
-        plt.savefig(f"{filename}.png")
-        plt.close()
-
-    def generate_eer_graph(self):
-        self.generate_line_chart(self.data['time'], self.data['energy_efficiency'], 'EER', 'Energy Efficiency Over Time', 'eer_chart.png', 'tab:blue')
-
-    def generate_pue_graph(self):
-        self.generate_line_chart(self.data['time'], self.data['power_efficiency'], 'PUE', 'Power Usage Effectiveness Over Time', 'pue_chart.png', 'tab:green')
-
-    def generate_line_chart(self, time_series, values, ylabel, title, filename, color):
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.set_xlabel("Time")
-        ax.set_ylabel(f"{ylabel} Ratio", color=color)
-        ax.plot(time_series, values, marker='o', color=color)
-        ax.tick_params(axis='y', labelcolor=color)
-        ax.set_ylim(0, 2)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-        fig.autofmt_xdate()
-
-        plt.title(title)
-        plt.tight_layout()
-        plt.grid(True, linestyle='--', linewidth=0.5, alpha=0.7)
-        plt.savefig(filename, dpi=300)
-        plt.close()
-
-    def add_top_devices_table(self, elements, top_devices):
+    def add_period_table(self, elements, periods, metric, context):
+        headers = ["Start", "End", "Duration", f"Min {metric}", f"Mean {metric}", f"Max {metric}"]
+        rows = [[
+            start.strftime('%Y-%m-%d %H:%M'),
+            end.strftime('%Y-%m-%d %H:%M'),
+            format_duration(duration),
+            f"{minimum:.2f}",
+            f"{mean:.2f}",
+            f"{maximum:.2f}",
+        ] for start, end, duration, minimum, mean, maximum in zip(
+            periods['start'], periods['end'], periods['duration'], periods['min'], periods['mean'], periods['max'])]
+
+        table = build_table(headers, rows, [100, 100, 60, 55, 60, 55], font_name=context.font_name)
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+
+    def create_image_table(self, charts):
+        return Table([charts], colWidths=[200, 200])
+
+    def create_gauge(self, value, max_value, title, context):
+        # The mean of a site without any data is NaN; show an empty gauge
+        value = 0.0 if pd.isna(value) else float(value)
+        if self.chart_backend == "reportlab":
+            with observe_stage("chart"):
+                return gauge_drawing(value, max_value, title, width=200, height=120,
+                                     font_name=context.font_name, bold_font_name=context.bold_font_name)
+        future = submit_chart(render_gauge, value, max_value, title, context.profile.gauge_dpi,
+                              context.profile.image_format, context.profile.jpeg_quality)
+        return ChartFlowable(future, width=200, height=120)
+
+    def generate_eer_graph(self, data, context):
+        return self.generate_line_chart(data['time'], data['energy_efficiency'], 'EER', 'Energy Efficiency Over Time', 'tab:blue', context)
+
+    def generate_pue_graph(self, data, context):
+        return self.generate_line_chart(data['time'], data['power_efficiency'], 'PUE', 'Power Usage Effectiveness Over Time', 'tab:green', context)
+
+    def generate_rack_heatmap(self, rack_series, context):
+        power = rack_series.pivot_table(index="rack_id", columns="time", values="total_PIn", aggfunc="sum") / 1000
+        hottest = power.max(axis=1).nlargest(RACK_HEATMAP_ROWS).index
+        power = power.loc[hottest]
+        names = rack_series.drop_duplicates("rack_id").set_index("rack_id")["rack_name"].reindex(hottest)
+        values, labels, times = power.to_numpy(dtype=float), names.astype(str).tolist(), power.columns.to_numpy()
+        title, label = "Rack Input Power Over Time", "Input Power (kW)"
+        height = min(max(120, 12 * len(labels) + 80), 480)
+        if self.chart_backend == "reportlab":
+            with observe_stage("chart"):
+                return heatmap_drawing(values, labels, times, title, label, width=400, height=height,
+                                       font_name=context.font_name)
+        future = submit_chart(render_heatmap, values, labels, times, title, label, height / 400,
+                              context.profile.chart_dpi, context.profile.image_format, context.profile.jpeg_quality)
+        return ChartFlowable(future, width=400, height=height)
+
+    def generate_line_chart(self, time_series, values, ylabel, title, color, context):
+        # Plot cost and legibility depend on point count, not window length; averages still use every bucket
+        time_series, values = downsample(time_series.to_numpy(), values.to_numpy(), context.profile.max_chart_points,
+                                         self.downsample_method)
+        if self.chart_backend == "reportlab":
+            with observe_stage("chart"):
+                return line_chart_drawing(time_series, values, ylabel, title, color,
+                                          width=400, height=200, markers=context.profile.chart_markers,
+                                          font_name=context.font_name)
+        future = submit_chart(render_line_chart, time_series, values, ylabel, title, color,
+                              context.profile.chart_dpi, context.profile.chart_markers, context.profile.image_format,
+                              context.profile.jpeg_quality)
+        return ChartFlowable(future, width=400, height=200)
+
+    def add_top_devices_table(self, elements, top_devices, context):
         # 'data' should be your original JSON
         headers = ["Device Name","IP Address", "Total Power", "Traffic Speed", "PCR",
                    "CO2 Emissions"]
-        print(headers)
-        data = [headers] + [[
-            device['device_name'],
-            device['ip_address'],
-            device['total_power'],
-            device['traffic_speed'],
-            device['pcr'],
-            device['co2emmissions'],
-        ] for device in top_devices]
-        print("also good till here")
-
-        table = Table(data, colWidths=[130, 70, 80, 80, 70, 80])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#448c35')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-        ]))
+        # Units are chosen per value here; the dataset keeps raw W / Mbps / kg
+        display = top_devices.assign(**{column: format_quantity(column_quantity(top_devices, column))
+                                        for column in ("total_power", "traffic_speed", "co2emmissions")})
+        rows = self.table_cells(display, DEVICE_TABLE_COLUMNS).tolist()
 
-        # Alternate row colors
-        for i in range(1, len(data)):
-            bg_color = colors.HexColor('#9cc993') if i % 2 == 0 else colors.white
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, i), (-1, i), bg_color)
-            ]))
+        table = build_table(headers, rows, [130, 70, 80, 80, 70, 80], font_name=context.font_name)
+        elements.append(table)
+        elements.append(Spacer(1, 20))
 
+    def add_site_table(self, elements, sites, context):
+        headers = ["Site Name", "Devices", "EER", "PUE", "Energy", "CO2 Emissions", "Top Device"]
+        display = sites.assign(**{column: format_quantity(column_quantity(sites, column))
+                                  for column in ("energy_kwh", "co2_kg")})
+        table = build_table(headers, self.table_cells(display, SITE_TABLE_COLUMNS).tolist(),
+                            [100, 50, 50, 50, 80, 80, 110], font_name=context.font_name)
         elements.append(table)
         elements.append(Spacer(1, 20))
 
-    def add_rack_table(self, elements, racks):
+    def add_comparison_tables(self, elements, comparison, movements, context):
+        headers = ["Metric", "This Period", "Previous Period", "Change", "Change (%)"]
+        rows = []
+        for metric, *values, change_pct in comparison.itertuples(index=False):
+            if metric in COLUMN_UNITS:
+                text = format_quantity(Quantity(values, COLUMN_UNITS[metric])).tolist()
+            else:
+                text = [f"{value:.2f}" for value in values]
+            # Units for the change are picked from its own magnitude, so mark the sign explicitly
+            text[2] = text[2] if values[2] < 0 else f"+{text[2]}"
+            rows.append([COMPARISON_LABELS.get(metric, metric), *text,
+                         "" if pd.isna(change_pct) else f"{change_pct:+.1f}%"])
+        elements.append(build_table(headers, rows, [110, 90, 100, 90, 80], font_name=context.font_name))
+        elements.append(Spacer(1, 10))
+
+        elements.append(Paragraph(
+            "Top devices by energy this period, with their rank in the previous period (a positive change means the device climbed):",
+            context.desc_style))
+        elements.append(Spacer(1, 10))
+        headers = ["Device Name", "IP Address", "Rank", "Prev. Rank", "Change", "Energy", "Prev. Energy"]
+        display = movements.assign(**{column: format_quantity(column_quantity(movements, column))
+                                      for column in ("energy_kwh", "previous_energy_kwh")})
+        display = display.assign(**{column: display[column].astype("Int64")
+                                    for column in ("rank", "previous_rank", "rank_change")})
+        rows = self.table_cells(display, MOVEMENT_TABLE_COLUMNS).tolist()
+        elements.append(build_table(headers, rows, [105, 70, 40, 60, 50, 70, 75], font_name=context.font_name))
+        elements.append(Spacer(1, 20))
+
+    def add_peak_tables(self, elements, devices, racks, context):
+        headers = ["Device Name", "IP Address", "P50", "P95", "P99", "Max"]
+        display = devices.assign(**{column: format_quantity(column_quantity(devices, column))
+                                    for column in PEAK_DEVICE_COLUMNS[2:]})
+        elements.append(build_table(headers, self.table_cells(display, PEAK_DEVICE_COLUMNS).tolist(),
+                                    [130, 80, 75, 75, 75, 75], font_name=context.font_name))
+        elements.append(Spacer(1, 10))
+
+        racks = racks.dropna(subset=["power_p95_kw"]).nlargest(PEAK_RACKS_SHOWN, "power_p95_kw")
+        if racks.empty:
+            return
+        headers = ["Rack Name", "Site Name", "P50", "P95", "P99", "Max"]
+        display = racks.assign(**{column: format_quantity(column_quantity(racks, column))
+                                  for column in PEAK_RACK_COLUMNS[2:]})
+        elements.append(build_table(headers, self.table_cells(display, PEAK_RACK_COLUMNS).tolist(),
+                                    [130, 80, 75, 75, 75, 75], font_name=context.font_name))
+        elements.append(Spacer(1, 20))
+
+    def add_rack_table(self, elements, racks, context):
         headers = ["Rack Name", "Building", "Site Name", "Number of Devices", "EER", "PUE",
                    "Power Input (kW)", "Data Traffic (GB)","PCR"]
-        data = [headers] + [[
-            rack["Rack Name"],
-            rack["Building"],
-            rack["Site Name"],
-            rack["Number of Devices"],
-            rack["EER"],
-            rack["PUE"],
-            rack["Power Input (kW)"],
-            rack["Data Traffic (GB)"],
-            rack["PCR"]
-
-        ] for rack in racks]
-        # col_widths = []  # Adjusted column widths
-        table = Table(data, colWidths=[80, 60, 70, 50, 50, 50, 70, 70, 50])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#448c35')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-        ]))
-
-        for i in range(1, len(data)):
-            bg_color = colors.HexColor('#9cc993') if i % 2 == 0 else colors.white
-            table.setStyle(TableStyle([('BACKGROUND', (0, i), (-1, i), bg_color)]))
+        col_widths = [80, 60, 70, 50, 50, 50, 70, 70, 50]
+        if context.streaming:
+            # Cell rows are only turned into lists page by page
+            elements.append(StreamingTable(headers, self.table_cells(racks, RACK_TABLE_COLUMNS), list, col_widths,
+                                           font_name=context.font_name))
+        else:
+            elements.append(build_table(headers, self.table_cells(racks, RACK_TABLE_COLUMNS).tolist(), col_widths,
+                                        font_name=context.font_name))
+        elements.append(Spacer(1, 20))
 
-        elements.append(table)
-        elements.append(Spacer(1, 20))
\ No newline at end of file
+    @staticmethod
+    def table_cells(frame, columns):
+        """2-D object array of the given columns, blanks for missing values."""
+        cells = frame[columns]
+        return cells.astype(object).where(cells.notna(), "").to_numpy()
\ No newline at end of file
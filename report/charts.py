@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from reportlab.platypus import Flowable, Image
+
+from metrics.metrics import STAGE_DURATION
+from metrics.tracing import current_context, record_span
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # Pin the backend and pay the matplotlib import once per worker, not once per chart
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.dates  # noqa: F401
+    import matplotlib.figure  # noqa: F401
+    import numpy  # noqa: F401
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _figure_to_image(fig, dpi, image_format, jpeg_quality):
+    buffer = BytesIO()
+    pil_kwargs = {'quality': jpeg_quality} if image_format == 'jpeg' else None
+    fig.savefig(buffer, format=image_format, dpi=dpi, pil_kwargs=pil_kwargs)
+    return buffer.getvalue()
+
+
+def render_gauge(value, max_value, title, dpi=100, image_format='png', jpeg_quality=95):
+    import numpy as np
+    from matplotlib.figure import Figure
+
+    color = '#448c35' if value <= 1.5 else '#1678b5' if value <= 2.0 else '#f5113b'
+    fig = Figure(figsize=(4, 3))
+    ax = fig.add_subplot(projection='polar')
+    ax.set_theta_offset(np.pi)
+    ax.set_theta_direction(-1)
+    ax.set_axis_off()
+    angle = np.pi * (value / max_value)
+    ax.barh(1, angle, left=0, height=0.3, color=color)
+    ax.barh(1, np.pi - angle, left=angle, height=0.3, color='lightgrey')
+    ax.text(0, 0, f'{value:.2f}', ha='center', va='center', fontsize=18, fontweight='bold')
+    ax.set_title(title, fontsize=12, color='grey', pad=15)
+    return _figure_to_image(fig, dpi, image_format, jpeg_quality)
+
+
+def render_line_chart(time_series, values, ylabel, title, color, dpi=300, markers=True, image_format='png',
+                      jpeg_quality=95):
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 4))
+    ax = fig.add_subplot()
+    ax.set_xlabel("Time")
+    ax.set_ylabel(f"{ylabel} Ratio", color=color)
+    ax.plot(time_series, values, marker='o' if markers else None, color=color)
+    ax.tick_params(axis='y', labelcolor=color)
+    ax.set_ylim(0, 2)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    fig.autofmt_xdate()
+
+    ax.set_title(title)
+    fig.tight_layout()
+    ax.grid(True, linestyle='--', linewidth=0.5, alpha=0.7)
+    return _figure_to_image(fig, dpi, image_format, jpeg_quality)
+
+
+def render_heatmap(values, row_labels, times, title, label, aspect=0.75, dpi=300, image_format='png',
+                   jpeg_quality=95):
+    """Rows x time grid of values (e.g. rack x bucket input power), colored low-to-high; aspect is height/width."""
+    import numpy as np
+    import pandas as pd
+    from matplotlib.figure import Figure
+
+    values = np.asarray(values, dtype=float)
+    fig = Figure(figsize=(8, 8 * aspect))
+    ax = fig.add_subplot()
+    image = ax.imshow(np.ma.masked_invalid(values), aspect='auto', cmap='YlOrRd', interpolation='nearest')
+    ax.set_yticks(range(len(row_labels)))
+    ax.set_yticklabels(row_labels, fontsize=7)
+    ticks = np.unique(np.linspace(0, values.shape[1] - 1, min(values.shape[1], 6)).astype(int))
+    ax.set_xticks(ticks)
+    ax.set_xticklabels(pd.DatetimeIndex(times)[ticks].strftime('%Y-%m-%d %H:%M'), fontsize=7, rotation=30, ha='right')
+    ax.set_xlabel("Time")
+    fig.colorbar(image, ax=ax).set_label(label)
+    ax.set_title(title)
+    fig.tight_layout()
+    return _figure_to_image(fig, dpi, image_format, jpeg_quality)
+
+
+def _timed_render(render, args):
+    start = time.perf_counter()
+    image = render(*args)
+    return image, time.perf_counter() - start
+
+
+def _record_render_time(future, render_name, context):
+    if not future.cancelled() and future.exception() is None:
+        STAGE_DURATION.observe(future.result()[1], stage="chart")
+        record_span(context, "chart", future.result()[1], render=render_name)
+
+
+def get_chart_pool():
+    """Shared warm pool of chart workers. Returns None when CHART_WORKERS is 0."""
+    global _pool
+    workers = int(os.getenv("CHART_WORKERS", "4"))
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the daemon forks from a process full of DB and executor threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker)
+            for future in [_pool.submit(_warm_up) for _ in range(workers)]:
+                future.result()
+        return _pool
+
+
+def shutdown_chart_pool():
+    """Stop the chart workers; a process that is itself a multiprocessing child cannot exit while they run."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def submit_chart(render, *args):
+    """Queue a chart render and return a future of (image_bytes, render_seconds)."""
+    pool = get_chart_pool()
+    if pool is None:
+        future = Future()
+        try:
+            future.set_result(_timed_render(render, args))
+        except Exception as e:
+            future.set_exception(e)
+    else:
+        future = pool.submit(_timed_render, render, args)
+    future.add_done_callback(partial(_record_render_time, render_name=render.__name__, context=current_context()))
+    return future
+
+
+class ChartFlowable(Flowable):
+    """Placeholder with a fixed size that only waits for its chart when the page is drawn.
+
+    This lets doc.build lay out the pages ahead of a chart while the pool is still rendering it.
+    """
+
+    def __init__(self, future, width, height):
+        super().__init__()
+        self.future = future
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+        self._image = None
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        if self._image is None:
+            image, _ = self.future.result()
+            self._image = Image(BytesIO(image), width=self.width, height=self.height)
+        self._image.drawOn(self.canv, 0, 0)
@@ -0,0 +1,62 @@
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return values.astype(float)
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of at most `threshold` points that keep the visual shape.
+
+    The first and last points are always kept; every other bucket contributes the point forming the
+    largest triangle with the previously kept point and the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x, y = _as_float(x), _as_float(y)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """Indices of the minimum and maximum of each of threshold/2 equal buckets, in time order."""
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    y = _as_float(y)
+    buckets = threshold // 2
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(np.linspace(0, n, buckets + 1).astype(np.int64)))
+    # Sorting by (bucket, value) puts each bucket's min first and max last
+    order = np.lexsort((y, bucket_ids))
+    boundaries = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+    firsts = np.concatenate(([0], boundaries))
+    lasts = np.concatenate((boundaries - 1, [n - 1]))
+    return np.unique(np.concatenate((order[firsts], order[lasts])))
+
+
+def downsample(x, y, max_points, method="lttb"):
+    """Cap a series at max_points for plotting while keeping its peaks and dips."""
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unsupported downsampling method: {method}")
+    x, y = np.asarray(x), np.asarray(y)
+    if not max_points or len(x) <= max_points:
+        return x, y
+    indices = lttb_indices(x, y, max_points) if method == "lttb" else minmax_indices(y, max_points)
+    return x[indices], y[indices]
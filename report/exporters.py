@@ -0,0 +1,160 @@
+import html
+import io
+import json
+import zipfile
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from power_data.dataset import COLUMN_UNITS
+from power_data.report_type import report_type_options
+
+# csv and parquet hold one table per section, so they are delivered as a zip of per-section files
+OUTPUT_EXTENSIONS = {"pdf": ".pdf", "json": ".json", "csv": ".zip", "parquet": ".zip", "html": ".html"}
+
+
+def output_format_for_report_type(report_type: Optional[str]) -> str:
+    """Output format named anywhere in Reports.report_type; PDF unless a data format is asked for."""
+    return report_type_options(report_type).get("format", "pdf")
+
+
+def output_extension(report_type: Optional[str]) -> str:
+    return OUTPUT_EXTENSIONS[output_format_for_report_type(report_type)]
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.isoformat()
+    return str(value)
+
+
+def _records(frame):
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+
+
+def _report_document(dataset):
+    document = {
+        "site_name": dataset.site_name,
+        "duration": dataset.duration,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "units": COLUMN_UNITS,
+        "summary_cards": dataset.summary,
+        "energy": _records(dataset.energy),
+        "top_devices": _records(dataset.top_devices),
+        "bottom_devices": _records(dataset.bottom_devices),
+        "racks": _records(dataset.racks),
+    }
+    if dataset.energy_breakdown is not None:
+        document["energy_breakdown"] = _records(dataset.energy_breakdown)
+    if dataset.sites is not None:
+        document["sites"] = _records(dataset.sites)
+    if dataset.rack_series is not None:
+        document["rack_series"] = _records(dataset.rack_series)
+    if dataset.comparison is not None:
+        document["comparison"] = {
+            "previous_period": {"start": dataset.previous_period[0], "end": dataset.previous_period[1]},
+            "metrics": _records(dataset.comparison),
+            "device_movements": _records(dataset.device_movements),
+        }
+    return document
+
+
+def export_json(filename, dataset):
+    with open(filename, "w") as f:
+        json.dump(_report_document(dataset), f, default=_json_default)
+
+
+def export_csv(filename, dataset):
+    sections = dataset.tables()
+    with zipfile.ZipFile(filename, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, frame in sections.items():
+            archive.writestr(f"{name}.csv", frame.to_csv(index=False))
+
+
+def export_parquet(filename, dataset):
+    sections = dataset.tables()
+    # Summary values mix ints and strings; parquet columns need one type
+    sections["summary"]["value"] = sections["summary"]["value"].astype(str)
+    with zipfile.ZipFile(filename, "w") as archive:
+        for name, frame in sections.items():
+            buffer = io.BytesIO()
+            frame.to_parquet(buffer, index=False)
+            archive.writestr(f"{name}.parquet", buffer.getvalue())
+
+
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Energy Consumption Report for {site_name}</title>
+<script src="https://cdn.jsdelivr.net/npm/chart.js@4"></script>
+<style>
+body {{ font-family: Helvetica, Arial, sans-serif; margin: 2em auto; max-width: 960px; color: #333; }}
+h1 {{ text-align: center; }}
+table {{ border-collapse: collapse; width: 100%; margin-bottom: 2em; }}
+th {{ background: #448c35; color: white; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: center; }}
+tr:nth-child(odd) td {{ background: #9cc993; }}
+.chart {{ height: 300px; margin-bottom: 2em; }}
+</style>
+</head>
+<body>
+<h1>Energy Consumption Report for {site_name}</h1>
+<h2>Reporting Period: {duration}</h2>
+{summary_table}
+<h2>Energy Efficiency Over Time</h2>
+<div class="chart"><canvas id="eer"></canvas></div>
+<h2>Power Utilization Over Time</h2>
+<div class="chart"><canvas id="pue"></canvas></div>
+<h2>Top 5 Devices Utilization</h2>
+{top_table}
+<h2>Bottom 5 Devices Utilization</h2>
+{bottom_table}
+<h2>{site_name}'s Rack wise Utilization</h2>
+{rack_table}
+<script>
+const energy = {energy_json};
+function trend(id, field, label, color) {{
+  new Chart(document.getElementById(id), {{
+    type: 'line',
+    data: {{ labels: energy.map(p => p.time),
+             datasets: [{{ label: label, data: energy.map(p => p[field]), borderColor: color, pointRadius: 2 }}] }},
+    options: {{ maintainAspectRatio: false, scales: {{ y: {{ min: 0, max: 2 }} }} }}
+  }});
+}}
+trend('eer', 'energy_efficiency', 'EER Ratio', '#1f77b4');
+trend('pue', 'power_efficiency', 'PUE Ratio', '#2ca02c');
+</script>
+</body>
+</html>
+"""
+
+
+def _html_table(frame):
+    if frame.empty:
+        return "<p>No data available.</p>"
+    return frame.to_html(index=False, border=0, na_rep="")
+
+
+def export_html(filename, dataset):
+    sections = dataset.tables()
+    # </ inside the inline JSON would close the script element early
+    energy_json = json.dumps(_records(dataset.energy), default=_json_default).replace("</", "<\\/")
+    page = _HTML_TEMPLATE.format(
+        site_name=html.escape(str(dataset.site_name)),
+        duration=html.escape(str(dataset.duration)),
+        summary_table=_html_table(sections["summary"]),
+        top_table=_html_table(sections["top_devices"]),
+        bottom_table=_html_table(sections["bottom_devices"]),
+        rack_table=_html_table(sections["racks"]),
+        energy_json=energy_json,
+    )
+    with open(filename, "w") as f:
+        f.write(page)
+
+
+EXPORTERS = {"json": export_json, "csv": export_csv, "parquet": export_parquet, "html": export_html}
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+PERIOD_COLUMNS = ["start", "end", "buckets", "duration", "min", "mean", "max"]
+
+
+def find_periods(times, values, mask) -> pd.DataFrame:
+    """Merge consecutive flagged buckets into periods without iterating rows.
+
+    times must be sorted. A period's duration runs from its first bucket to the end of its last one,
+    using the median bucket spacing as the bucket width.
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return pd.DataFrame(columns=PERIOD_COLUMNS)
+
+    # Run boundaries are where the padded mask flips; starts and (exclusive) ends alternate
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    lengths = ends - starts
+
+    flagged = values[mask]
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    bucket = np.median(np.diff(times)) if len(times) > 1 else np.timedelta64(0, 'ns')
+
+    return pd.DataFrame({
+        "start": times[starts],
+        "end": times[ends - 1],
+        "buckets": lengths,
+        "duration": times[ends - 1] - times[starts] + bucket,
+        "min": np.minimum.reduceat(flagged, offsets),
+        "mean": np.add.reduceat(flagged, offsets) / lengths,
+        "max": np.maximum.reduceat(flagged, offsets),
+    })
+
+
+def worst_periods(periods: pd.DataFrame, by: str, ascending: bool, n: int) -> pd.DataFrame:
+    """Top-n periods by the given statistic, worst first; ties go to the longer period."""
+    if periods.empty:
+        return periods
+    key = periods[by].to_numpy(dtype=float)
+    order = np.lexsort((-periods['buckets'].to_numpy(), key if ascending else -key))
+    return periods.iloc[order[:n]].reset_index(drop=True)
+
+
+def format_duration(duration) -> str:
+    total_minutes = int(pd.Timedelta(duration).total_seconds() // 60)
+    days, remainder = divmod(total_minutes, 24 * 60)
+    hours, minutes = divmod(remainder, 60)
+    parts = [f"{days}d" if days else "", f"{hours}h" if hours else "", f"{minutes}m" if minutes else ""]
+    return " ".join(part for part in parts if part) or "0m"
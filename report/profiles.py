@@ -0,0 +1,57 @@
+from typing import NamedTuple, Optional
+
+from reportlab.lib.fonts import addMapping
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+from power_data.report_type import report_type_options
+
+
+class RenderProfile(NamedTuple):
+    name: str
+    chart_dpi: int
+    gauge_dpi: int
+    chart_markers: bool
+    max_chart_points: int  # trend series are downsampled to this many points before plotting
+    image_format: str  # "jpeg" is embedded as-is (DCT); "png" is decoded and re-deflated losslessly by reportlab
+    jpeg_quality: int
+    page_compression: int
+    embed_fonts: bool  # TrueType text instead of the non-embedded base-14 Helvetica
+
+
+PROFILES = {
+    "draft": RenderProfile("draft", chart_dpi=72, gauge_dpi=72, chart_markers=False, max_chart_points=150, image_format="jpeg", jpeg_quality=60,
+                           page_compression=0, embed_fonts=False),
+    "screen": RenderProfile("screen", chart_dpi=110, gauge_dpi=100, chart_markers=True, max_chart_points=400, image_format="jpeg", jpeg_quality=85,
+                            page_compression=1, embed_fonts=False),
+    "print": RenderProfile("print", chart_dpi=300, gauge_dpi=100, chart_markers=True, max_chart_points=1000, image_format="png", jpeg_quality=95,
+                           page_compression=1, embed_fonts=True),
+}
+
+DEFAULT_PROFILE = "print"
+
+
+def profile_for_report_type(report_type: Optional[str]) -> RenderProfile:
+    """Pick the profile named anywhere in a report type such as "Energy Report (screen)"."""
+    return PROFILES[report_type_options(report_type).get("profile", DEFAULT_PROFILE)]
+
+
+_registered_fonts = False
+
+
+def report_fonts(profile: RenderProfile):
+    """(regular, bold) font names for a profile, registering the embedded TrueType family on first use."""
+    global _registered_fonts
+    if not profile.embed_fonts:
+        return "Helvetica", "Helvetica-Bold"
+    if not _registered_fonts:
+        # Bitstream Vera ships with reportlab, so print output is self-contained without system fonts
+        for name, filename in (("Vera", "Vera.ttf"), ("VeraBd", "VeraBd.ttf"),
+                               ("VeraIt", "VeraIt.ttf"), ("VeraBI", "VeraBI.ttf")):
+            pdfmetrics.registerFont(TTFont(name, filename))
+        addMapping("Vera", 0, 0, "Vera")
+        addMapping("Vera", 1, 0, "VeraBd")
+        addMapping("Vera", 0, 1, "VeraIt")
+        addMapping("Vera", 1, 1, "VeraBI")
+        _registered_fonts = True
+    return "Vera", "VeraBd"
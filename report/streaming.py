@@ -0,0 +1,52 @@
+from reportlab.platypus import Flowable
+
+from report.tables import build_table, row_height
+
+
+class StreamingTable(Flowable):
+    """Banded table that materializes one page at a time.
+
+    Only the raw records are held; each time the frame splits this flowable, the rows that fit on the
+    current page are converted with row_builder into a page-sized LongTable and the remainder stays a
+    StreamingTable. Peak memory is therefore one page of cells however long the table gets, and the
+    header still starts every page.
+    """
+
+    def __init__(self, headers, records, row_builder, col_widths, font_name='Helvetica', start=0):
+        super().__init__()
+        self.headers = headers
+        self.records = records
+        self.row_builder = row_builder
+        self.col_widths = col_widths
+        self.font_name = font_name
+        self.start = start
+        self.row_height = row_height()
+        self.width = sum(col_widths)
+        self.hAlign = 'CENTER'
+
+    def _remaining(self):
+        return len(self.records) - self.start
+
+    def _page(self, stop):
+        rows = [self.row_builder(record) for record in self.records[self.start:stop]]
+        # Keep the white/green banding continuous with the rows on earlier pages
+        return build_table(self.headers, rows, self.col_widths, font_name=self.font_name, band_offset=self.start)
+
+    def wrap(self, availWidth, availHeight):
+        self.height = (1 + self._remaining()) * self.row_height
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        fitting_rows = int((availHeight + 1e-6) // self.row_height) - 1
+        if fitting_rows <= 0:
+            return []
+        stop = self.start + fitting_rows
+        if stop >= len(self.records):
+            return [self._page(len(self.records))]
+        return [self._page(stop),
+                StreamingTable(self.headers, self.records, self.row_builder, self.col_widths, self.font_name, stop)]
+
+    def draw(self):
+        table = self._page(len(self.records))
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
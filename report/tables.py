@@ -0,0 +1,34 @@
+from reportlab.lib import colors
+from reportlab.platypus import LongTable, TableStyle
+
+HEADER_COLOR = colors.HexColor('#448c35')
+BAND_COLOR = colors.HexColor('#9cc993')
+
+
+def row_height(font_size=10, bottom_padding=8, top_padding=3):
+    return font_size * 1.2 + top_padding + bottom_padding
+
+
+def build_table(headers, rows, col_widths, font_name='Helvetica', font_size=10, bottom_padding=8, top_padding=3,
+                band_offset=0):
+    """Banded report table that stays cheap to lay out and split at thousands of rows.
+
+    Cells are single-line strings, so every row height is known up front and reportlab never has to
+    measure cells; the header repeats on each page the table splits onto.
+    """
+    data = [headers] + rows
+    height = row_height(font_size, bottom_padding, top_padding)
+    bands = [colors.white, BAND_COLOR] if band_offset % 2 == 0 else [BAND_COLOR, colors.white]
+    table = LongTable(data, colWidths=col_widths, rowHeights=[height] * len(data), repeatRows=1, splitByRow=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), HEADER_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), bands),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), font_size),
+        ('TOPPADDING', (0, 0), (-1, -1), top_padding),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), bottom_padding),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+    ]))
+    return table
@@ -0,0 +1,19 @@
+import numpy as np
+
+from power_data.quantity import UNIT_LADDERS, Quantity
+
+
+def format_quantity(quantity: Quantity, decimals=2):
+    """Text for every value at once, each in the largest unit of its ladder it reaches (1500 W -> "1.5 kW").
+
+    Missing values render blank.
+    """
+    ladder = UNIT_LADDERS[quantity.dimension]
+    names = np.array([unit for unit, _ in ladder])
+    sizes = np.array([size for _, size in ladder])
+    values = np.asarray(quantity.to(ladder[0][0]).value, dtype=float)
+
+    step = np.clip(np.searchsorted(sizes, np.abs(np.nan_to_num(values)), side="right") - 1, 0, len(ladder) - 1)
+    scaled = np.round(values / sizes[step], decimals)
+    text = np.char.add(np.char.add(scaled.astype(str), " "), names[step])
+    return np.where(np.isnan(values), "", text)
@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from reportlab.graphics.charts.lineplots import LinePlot
+from reportlab.graphics.shapes import Drawing, Group, Rect, String, Wedge
+from reportlab.graphics.widgets.markers import makeMarker
+from reportlab.lib import colors
+
+# matplotlib's tab10 names used by the matplotlib backend, so both backends share one palette
+_NAMED_COLORS = {'tab:blue': '#1f77b4', 'tab:green': '#2ca02c'}
+# Ends of matplotlib's YlOrRd map used for heatmaps
+_HEAT_LOW, _HEAT_HIGH = colors.HexColor('#ffffcc'), colors.HexColor('#bd0026')
+
+
+def _color(color):
+    return colors.HexColor(_NAMED_COLORS.get(color, color))
+
+
+def gauge_drawing(value, max_value, title, width=200, height=120, font_name='Helvetica', bold_font_name='Helvetica-Bold'):
+    """Half-doughnut gauge equivalent to report.charts.render_gauge, as native PDF vectors."""
+    fill = '#448c35' if value <= 1.5 else '#1678b5' if value <= 2.0 else '#f5113b'
+    drawing = Drawing(width, height)
+    cx, cy = width / 2, height * 0.2
+    radius = min(width / 2 - 10, height * 0.6)
+    fraction = min(max(value / max_value, 0), 1) if max_value else 0
+    split = 180 - 180 * fraction
+
+    if fraction > 0:
+        drawing.add(Wedge(cx, cy, radius, split, 180, radius1=radius * 0.7,
+                          fillColor=colors.HexColor(fill), strokeColor=None))
+    if fraction < 1:
+        drawing.add(Wedge(cx, cy, radius, 0, split, radius1=radius * 0.7,
+                          fillColor=colors.lightgrey, strokeColor=None))
+    drawing.add(String(cx, cy + 4, f'{value:.2f}', fontName=bold_font_name, fontSize=16, textAnchor='middle'))
+    drawing.add(String(cx, height - 12, title, fontName=font_name, fontSize=10, fillColor=colors.grey,
+                       textAnchor='middle'))
+    return drawing
+
+
+def line_chart_drawing(time_series, values, ylabel, title, color, width=400, height=200, markers=True,
+                       font_name='Helvetica'):
+    """Trend chart equivalent to report.charts.render_line_chart, drawn with a reportlab LinePlot."""
+    stroke = _color(color)
+    seconds = np.asarray(time_series, dtype='datetime64[s]').astype(np.int64).astype(float)
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    points = list(zip(seconds[finite].tolist(), values[finite].tolist()))
+
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 12, title, fontName=font_name, fontSize=10, textAnchor='middle'))
+    # Rotate the y label a quarter turn about its anchor, as matplotlib does
+    drawing.add(Group(String(0, 0, f"{ylabel} Ratio", fontName=font_name, fontSize=8, fillColor=stroke,
+                             textAnchor='middle'), transform=(0, 1, -1, 0, 14, height / 2 + 10)))
+    drawing.add(String(width / 2, 4, "Time", fontName=font_name, fontSize=8, textAnchor='middle'))
+    if not points:
+        drawing.add(String(width / 2, height / 2, "No data", fontName=font_name, fontSize=9, textAnchor='middle'))
+        return drawing
+
+    plot = LinePlot()
+    plot.x, plot.y = 45, 55
+    plot.width, plot.height = width - 60, height - 80
+    plot.data = [points]
+    plot.joinedLines = 1
+    plot.lines[0].strokeColor = stroke
+    plot.lines[0].strokeWidth = 1
+    if markers:
+        plot.lines[0].symbol = makeMarker('FilledCircle', size=2.5, fillColor=stroke, strokeColor=stroke)
+
+    plot.yValueAxis.valueMin = 0
+    plot.yValueAxis.valueMax = 2
+    plot.yValueAxis.valueStep = 0.25
+    plot.yValueAxis.labels.fontName = font_name
+    plot.yValueAxis.labels.fontSize = 7
+    plot.yValueAxis.labels.fillColor = stroke
+    plot.yValueAxis.visibleGrid = 1
+    plot.yValueAxis.gridStrokeColor = colors.Color(0, 0, 0, alpha=0.3)
+    plot.yValueAxis.gridStrokeWidth = 0.25
+    plot.yValueAxis.gridStrokeDashArray = (2, 2)
+
+    start, end = seconds[0], seconds[-1]
+    if start == end:
+        start, end = start - 1800, end + 1800
+    plot.xValueAxis.valueMin = start
+    plot.xValueAxis.valueMax = end
+    plot.xValueAxis.valueSteps = np.linspace(start, end, 6).tolist()
+    plot.xValueAxis.labelTextFormat = lambda v: datetime.fromtimestamp(v, timezone.utc).strftime('%Y-%m-%d %H:%M')
+    plot.xValueAxis.labels.fontName = font_name
+    plot.xValueAxis.labels.fontSize = 6
+    plot.xValueAxis.labels.angle = 30
+    plot.xValueAxis.labels.boxAnchor = 'ne'
+    plot.xValueAxis.visibleGrid = 1
+    plot.xValueAxis.gridStrokeColor = colors.Color(0, 0, 0, alpha=0.3)
+    plot.xValueAxis.gridStrokeWidth = 0.25
+    plot.xValueAxis.gridStrokeDashArray = (2, 2)
+
+    drawing.add(plot)
+    return drawing
+
+
+def heatmap_drawing(values, row_labels, times, title, label, width=400, height=300, font_name='Helvetica'):
+    """Rows x time grid equivalent to report.charts.render_heatmap, one filled rectangle per cell."""
+    values = np.asarray(values, dtype=float)
+    rows, columns = values.shape
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 12, title, fontName=font_name, fontSize=10, textAnchor='middle'))
+    if not values.size or not np.isfinite(values).any():
+        drawing.add(String(width / 2, height / 2, "No data", fontName=font_name, fontSize=9, textAnchor='middle'))
+        return drawing
+
+    left, bottom, right, top = 80, 50, 50, 22
+    cell_width = (width - left - right) / columns
+    cell_height = (height - bottom - top) / rows
+    low, high = np.nanmin(values), np.nanmax(values)
+    scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+    for row in range(rows):
+        y = height - top - (row + 1) * cell_height
+        for column in range(columns):
+            fraction = scaled[row, column]
+            fill = colors.lightgrey if np.isnan(fraction) else \
+                colors.linearlyInterpolatedColor(_HEAT_LOW, _HEAT_HIGH, 0, 1, float(fraction))
+            drawing.add(Rect(left + column * cell_width, y, cell_width, cell_height, fillColor=fill,
+                             strokeColor=None))
+        drawing.add(String(left - 4, y + cell_height / 2 - 2.5, str(row_labels[row]), fontName=font_name,
+                           fontSize=min(7, cell_height), textAnchor='end'))
+
+    seconds = np.asarray(times, dtype='datetime64[s]').astype(np.int64)
+    for column in np.unique(np.linspace(0, columns - 1, min(columns, 6)).astype(int)):
+        text = datetime.fromtimestamp(int(seconds[column]), timezone.utc).strftime('%Y-%m-%d %H:%M')
+        drawing.add(Group(String(0, 0, text, fontName=font_name, fontSize=6, textAnchor='end'),
+                          transform=(0.866, 0.5, -0.5, 0.866, left + (column + 0.5) * cell_width, bottom - 4)))
+
+    # Color scale: low at the bottom, high at the top, labelled with both ends
+    steps = 20
+    scale_height = (height - bottom - top) / steps
+    for step in range(steps):
+        drawing.add(Rect(width - right + 10, bottom + step * scale_height, 10, scale_height, strokeColor=None,
+                         fillColor=colors.linearlyInterpolatedColor(_HEAT_LOW, _HEAT_HIGH, 0, steps - 1, step)))
+    drawing.add(String(width - right + 22, bottom, f'{low:.2f}', fontName=font_name, fontSize=6))
+    drawing.add(String(width - right + 22, height - top - 6, f'{high:.2f}', fontName=font_name, fontSize=6))
+    drawing.add(Group(String(0, 0, label, fontName=font_name, fontSize=7, textAnchor='middle'),
+                      transform=(0, 1, -1, 0, width - 4, bottom + (height - bottom - top) / 2)))
+    return drawing